@@ -0,0 +1,299 @@
+"""Бенчмарки загрузки и базы на синтетических данных.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run ingest --photos 500 --conv-layers 4
+    python -m benchmarks.run database --sizes 10000 100000 1000000
+
+Результат - JSON, который можно сравнивать между версиями.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from benchmarks.synthetic import make_dataset, make_stand_in_model, burst_timestamps
+
+SUITES = ['ingest', 'database']
+DEFAULT_DB_SIZES = [10000, 100000, 1000000]
+DB_CAMERAS = 10
+QUERY_REPEATS = 20
+
+
+def percentiles(samples):
+    samples = np.asarray(samples, dtype=np.float64) * 1000
+    if len(samples) == 0:
+        return None
+    return {
+        'count': len(samples),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'max_ms': float(samples.max()),
+    }
+
+
+def timed(function, *args, repeats=1):
+    samples = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+def drain(generator_function, *args):
+    """Вычитывает генератор целиком, не сохраняя строки, - как при потоковой выгрузке."""
+    count = 0
+    for _ in generator_function(*args):
+        count += 1
+    return count
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    versions = {}
+    for module in ('numpy', 'cv2', 'onnxruntime', 'PIL'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    import sqlite3
+    versions['sqlite'] = sqlite3.sqlite_version
+    return {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': versions,
+    }
+
+
+def bench_ingestion(args, workdir):
+    from database import Database
+    from detector import YoloDetector
+    from ingestion import IngestionPipeline, ingest_folder, list_image_files
+    from postprocess import postprocess_batch
+    from preprocessing import fill_tensor, inverse_transforms
+
+    data_dir = args.data or os.path.join(workdir, 'data')
+    if args.data:
+        folders = [os.path.join(data_dir, name) for name in sorted(os.listdir(data_dir))]
+    else:
+        folders = make_dataset(data_dir, cameras=args.cameras, photos_per_camera=args.photos // args.cameras,
+                               width=args.width, height=args.height, burst_size=args.burst_size,
+                               burst_interval=timedelta(seconds=args.burst_interval),
+                               gap=timedelta(minutes=args.gap_minutes))
+    model_path = args.model or make_stand_in_model(os.path.join(workdir, 'stand_in.onnx'), args.input_size,
+                                                   conv_layers=args.conv_layers)
+    labels = [str(i) for i in range(19)]
+    detector = YoloDetector(model_path, labels, batch_size=args.batch_size, input_size=args.input_size)
+
+    # Стадии по отдельности на первой папке
+    paths = [os.path.join(folders[0], name) for name in sorted(list_image_files(folders[0]))][:args.stage_photos]
+    decode, letterbox, prepared = [], [], []
+    for path in paths:
+        (image, source_size), samples = timed(detector.read_image, path)
+        decode.extend(samples)
+        (canvas, info), samples = timed(detector.preprocess, image, None, source_size)
+        letterbox.extend(samples)
+        prepared.append((canvas, info))
+
+    fill, inference, postprocess = [], [], []
+    for start in range(0, len(prepared), detector.batch_size):
+        chunk = prepared[start:start + detector.batch_size]
+        begin = time.perf_counter()
+        for slot, (canvas, _) in enumerate(chunk):
+            fill_tensor(canvas, detector.input_buffer[slot])
+        fill.append(time.perf_counter() - begin)
+        outputs, samples = timed(detector.session.run, [detector.output_name],
+                                 {detector.input_name: detector.input_buffer[:len(chunk)]})
+        inference.extend(samples)
+        infos = [info for _, info in chunk]
+        _, samples = timed(postprocess_batch, outputs[0], inverse_transforms(infos),
+                           [(info.width, info.height) for info in infos], detector.thresholds,
+                           detector.iou_threshold, detector.top_k)
+        postprocess.extend(samples)
+
+    # Конвейер целиком, как при загрузке из приложения
+    pipeline = IngestionPipeline(detector, decode_workers=args.decode_workers)
+    db = Database(os.path.join(workdir, 'ingest.db'), os.devnull)
+    start = time.perf_counter()
+    folder_stats = [ingest_folder(folder, pipeline, db) for folder in folders]
+    elapsed = time.perf_counter() - start
+    db.conn.close()
+    processed = sum(stats['processed'] for stats in folder_stats)
+
+    return {
+        'photos': processed,
+        'image_size': [args.width, args.height],
+        'input_size': args.input_size,
+        'batch_size': detector.batch_size,
+        'decode_workers': pipeline.decode_workers,
+        'model': 'stand-in' if not args.model else os.path.basename(args.model),
+        'elapsed_s': elapsed,
+        'photos_per_s': processed / elapsed if elapsed else None,
+        'stages': {
+            'decode': percentiles(decode),
+            'letterbox': percentiles(letterbox),
+            'fill_tensor_batch': percentiles(fill),
+            'inference_batch': percentiles(inference),
+            'postprocess_batch': percentiles(postprocess),
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def synthetic_scenes(size, rng):
+    """Сцены с фото и детекциями для add_scenes: DB_CAMERAS папок, серии по 5 кадров."""
+    per_camera = size // DB_CAMERAS
+    for camera in range(1, DB_CAMERAS + 1):
+        folder = f"/data/cameras/{camera}"
+        timestamps = burst_timestamps(per_camera, rng=rng)
+        counts = rng.integers(0, 3, per_camera)
+        scene = []
+        for index, timestamp in enumerate(timestamps):
+            if scene and timestamp - scene[-1]['timestamp'] > timedelta(minutes=30):
+                yield max(photo['animal_count'] for photo in scene), scene
+                scene = []
+            detections = [(100 * k, 100, 100 * k + 80, 180, int(rng.integers(0, 19)), 0.9, k + 1)
+                          for k in range(int(counts[index]))]
+            scene.append({
+                'path': f"{folder}/IMG_{index:07d}.JPG",
+                'timestamp': timestamp,
+                'animal_count': len(detections),
+                'detections': detections,
+            })
+        if scene:
+            yield max(photo['animal_count'] for photo in scene), scene
+
+
+def bench_database(size, workdir):
+    from database import Database
+
+    db_path = os.path.join(workdir, f'bench_{size}.db')
+    db = Database(db_path, os.devnull)
+    db.sync_classes([str(i) for i in range(19)])
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    batch = []
+    for scene in synthetic_scenes(size, rng):
+        batch.append(scene)
+        if len(batch) >= 500:
+            db.add_scenes(batch)
+            batch = []
+    if batch:
+        db.add_scenes(batch)
+    write_s = time.perf_counter() - start
+    rows = db.count_photos()
+
+    folder = db.get_unique_folders()[0]
+    middle = db.get_timestamps_for_folder(folder)[rows // DB_CAMERAS // 2]
+    results = {
+        'rows': rows,
+        'write_s': write_s,
+        'write_rows_per_s': rows / write_s if write_s else None,
+        'file_size_mb': os.path.getsize(db_path) / 1024 / 1024,
+    }
+    queries = {
+        'get_photos': (db.get_photos, (), 3),
+        'get_photos(folder)': (db.get_photos, (folder,), 3),
+        'get_photos_page(folder)': (db.get_photos_page, (folder,), QUERY_REPEATS),
+        'get_photos_page(folder, offset)': (db.get_photos_page, (folder, None, 15, rows // DB_CAMERAS // 2), QUERY_REPEATS),
+        'iter_export_data': (drain, (db.iter_export_data,), 3),
+        'iter_export_data(folder)': (drain, (db.iter_export_data, folder), 3),
+        'get_photos_for_map': (db.get_photos_for_map, (folder, middle), QUERY_REPEATS),
+        'get_timestamps_for_folder': (db.get_timestamps_for_folder, (folder,), 3),
+    }
+    results['queries'] = {}
+    for name, (function, query_args, repeats) in queries.items():
+        _, samples = timed(function, *query_args, repeats=repeats)
+        results['queries'][name] = percentiles(samples)
+    db.conn.close()
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='benchmarks.run', description="Бенчмарки ForestEye")
+    parser.add_argument('suites', nargs='*', metavar='{ingest,database}', help="по умолчанию оба")
+    parser.add_argument('--output', help="файл для JSON; по умолчанию stdout")
+    parser.add_argument('--workdir', help="каталог для данных и баз; по умолчанию временный")
+
+    ingest = parser.add_argument_group('ingest')
+    ingest.add_argument('--data', help="готовые папки с фото вместо синтетических")
+    ingest.add_argument('--model', help="модель вместо заглушки, например models/best.onnx")
+    ingest.add_argument('--photos', type=int, default=200)
+    ingest.add_argument('--cameras', type=int, default=2)
+    ingest.add_argument('--width', type=int, default=1920)
+    ingest.add_argument('--height', type=int, default=1080)
+    ingest.add_argument('--burst-size', type=int, default=5)
+    ingest.add_argument('--burst-interval', type=float, default=2, help="секунды между кадрами серии")
+    ingest.add_argument('--gap-minutes', type=float, default=45, help="средняя пауза между сериями")
+    ingest.add_argument('--input-size', type=int, default=1024)
+    ingest.add_argument('--batch-size', type=int, default=8)
+    ingest.add_argument('--decode-workers', type=int, default=None)
+    ingest.add_argument('--conv-layers', type=int, default=0, help="свёртки в заглушке для нагрузки на инференс")
+    ingest.add_argument('--stage-photos', type=int, default=64, help="сколько фото замерять по стадиям")
+
+    database = parser.add_argument_group('database')
+    database.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_DB_SIZES)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    args.suites = args.suites or SUITES
+    for suite in args.suites:
+        if suite not in SUITES:
+            parser.error(f"неизвестный набор: {suite}")
+    if args.decode_workers is None:
+        from ingestion import DEFAULT_DECODE_WORKERS
+        args.decode_workers = DEFAULT_DECODE_WORKERS
+
+    results = {'environment': environment()}
+    with tempfile.TemporaryDirectory(prefix='foresteye_bench_') as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        if 'ingest' in args.suites:
+            print("ingest...", file=sys.stderr)
+            results['ingest'] = bench_ingestion(args, workdir)
+        if 'database' in args.suites:
+            results['database'] = {}
+            for size in args.sizes:
+                print(f"database {size}...", file=sys.stderr)
+                results['database'][str(size)] = bench_database(size, workdir)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
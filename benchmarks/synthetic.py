@@ -0,0 +1,112 @@
+"""Синтетические данные для бенчмарков: папки JPEG с EXIF-временем и модель-заглушка."""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from PIL import Image
+
+from exif_timestamp import EXIF_DATETIME_FORMAT, TAG_DATETIME, TAG_DATETIME_ORIGINAL, TAG_EXIF_IFD
+
+DEFAULT_START = datetime(2024, 6, 1, 6, 0, 0)
+
+
+def burst_timestamps(count, start=DEFAULT_START, burst_size=5, burst_interval=timedelta(seconds=2),
+                     gap=timedelta(minutes=45), rng=None):
+    """Время съёмки как у фотоловушки: серии по burst_size кадров, между сериями -
+    случайная пауза около gap (от половины до полутора gap)."""
+    rng = rng or np.random.default_rng(0)
+    timestamps = []
+    current = start
+    for index in range(count):
+        if index and index % burst_size == 0:
+            current += gap * float(rng.uniform(0.5, 1.5))
+        elif index:
+            current += burst_interval
+        timestamps.append(current.replace(microsecond=0))
+    return timestamps
+
+
+def write_jpeg(path, image, timestamp, quality=90):
+    exif = Image.Exif()
+    exif[TAG_DATETIME] = timestamp.strftime(EXIF_DATETIME_FORMAT)
+    exif.get_ifd(TAG_EXIF_IFD)[TAG_DATETIME_ORIGINAL] = timestamp.strftime(EXIF_DATETIME_FORMAT)
+    Image.fromarray(image).save(path, 'JPEG', quality=quality, exif=exif)
+
+
+def synthetic_image(width, height, rng):
+    """Сглаженный шум: жмётся в JPEG примерно как фото, а не как белый шум."""
+    small = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    image = np.asarray(Image.fromarray(small).resize((width, height), Image.BILINEAR))
+    noise = rng.integers(-12, 13, image.shape, dtype=np.int16)
+    return np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def make_dataset(root, cameras=2, photos_per_camera=100, width=1920, height=1080, burst_size=5,
+                 burst_interval=timedelta(seconds=2), gap=timedelta(minutes=45), distinct_images=8, seed=0):
+    """Создаёт root/1, root/2, ... с JPEG-фото. Возвращает список папок.
+
+    Уникальных картинок distinct_images на камеру (генерация шума медленная),
+    но каждый файл сохраняется заново со своим EXIF.
+    """
+    rng = np.random.default_rng(seed)
+    folders = []
+    for camera in range(1, cameras + 1):
+        folder = os.path.join(root, str(camera))
+        os.makedirs(folder, exist_ok=True)
+        images = [synthetic_image(width, height, rng) for _ in range(distinct_images)]
+        timestamps = burst_timestamps(photos_per_camera, burst_size=burst_size, burst_interval=burst_interval,
+                                      gap=gap, rng=rng)
+        for index, timestamp in enumerate(timestamps):
+            write_jpeg(os.path.join(folder, f"IMG_{index:06d}.JPG"), images[index % distinct_images], timestamp)
+        folders.append(folder)
+    return folders
+
+
+def make_stand_in_model(path, input_size=1024, num_classes=19, num_boxes=300, conv_layers=0):
+    """ONNX-модель с тем же входом и выходом, что у best.onnx: images (batch, 3, S, S) ->
+    (batch, num_boxes, 6) x1, y1, x2, y2, confidence, class.
+
+    Выход берётся из пикселей входа, поэтому детекции случайные, но постобработка
+    и NMS работают с реалистичным числом кандидатов. conv_layers добавляет свёртки
+    3x3 по всему входу, чтобы приблизить стоимость инференса к настоящей модели.
+    """
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    rng = np.random.default_rng(0)
+    nodes = []
+    initializers = []
+    current = 'images'
+    for layer in range(conv_layers):
+        weight = f'conv{layer}_w'
+        initializers.append(numpy_helper.from_array(
+            (rng.standard_normal((3, 3, 3, 3)) * 0.1 + np.eye(3)[:, :, None, None] / 9).astype(np.float32), weight))
+        output = f'conv{layer}'
+        nodes.append(helper.make_node('Conv', [current, weight], [output], pads=[1, 1, 1, 1]))
+        current = output
+
+    initializers += [
+        numpy_helper.from_array(np.array([0, 0, 0, 0], np.int64), 'starts'),
+        # Батч берётся целиком, поэтому модель работает с пачкой любого размера
+        numpy_helper.from_array(np.array([2 ** 62, 1, num_boxes, 6], np.int64), 'ends'),
+        numpy_helper.from_array(np.array([0, 1, 2, 3], np.int64), 'axes'),
+        numpy_helper.from_array(np.array([1], np.int64), 'squeeze_axes'),
+        numpy_helper.from_array(np.array([input_size, input_size, input_size, input_size, 1, num_classes - 1],
+                                         np.float32), 'scale'),
+    ]
+    nodes += [
+        helper.make_node('Slice', [current, 'starts', 'ends', 'axes'], ['sliced']),
+        helper.make_node('Squeeze', ['sliced', 'squeeze_axes'], ['squeezed']),
+        helper.make_node('Mul', ['squeezed', 'scale'], ['output0']),
+    ]
+    graph = helper.make_graph(
+        nodes, 'stand_in',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, ['batch', 3, input_size, input_size])],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, ['batch', num_boxes, 6])],
+        initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 7
+    onnx.checker.check_model(model)
+    onnx.save(model, path)
+    return path
@@ -1,12 +1,278 @@
+import json
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 
+DEFAULT_DB_PATH = 'animal_counter.db'
+DEFAULT_LABELS_PATH = 'labels.txt'
+# Пороги уверенности по классам, строки 'Tiger=0.3'; необязательный файл
+DEFAULT_THRESHOLDS_PATH = 'thresholds.txt'
+
+
+PHOTO_COLUMNS = "id, path, folder, upload_date, processed, scene_id, animal_count, unique_animal_count, timestamp"
+
+PHOTOS_SQL = f"""
+    SELECT {PHOTO_COLUMNS}
+    FROM photos 
+    ORDER BY timestamp DESC
+"""
+
+PHOTOS_IN_FOLDER_SQL = f"""
+    SELECT {PHOTO_COLUMNS}
+    FROM photos 
+    WHERE folder = ? 
+    ORDER BY timestamp DESC
+"""
+
+LAST_PHOTO_IN_SCENE_SQL = """
+    SELECT * FROM photos 
+    WHERE scene_id = ? 
+    ORDER BY timestamp DESC 
+    LIMIT 1
+"""
+
+TIMESTAMPS_FOR_FOLDER_SQL = """
+    SELECT timestamp
+    FROM photos
+    WHERE folder = ?
+    ORDER BY timestamp
+"""
+
+# Даты съёмки папки: рекурсивный CTE прыгает по индексу к первому снимку следующего дня,
+# поэтому число шагов равно числу дат, а не фото. {folder_filter} - условие на папку или пусто
+DATES_SQL_TEMPLATE = """
+    WITH RECURSIVE dates(day) AS (
+        SELECT date((SELECT timestamp FROM photos WHERE {folder_filter} 1 ORDER BY timestamp LIMIT 1))
+        UNION ALL
+        SELECT date((SELECT timestamp FROM photos
+                     WHERE {folder_filter} timestamp >= date(day, '+1 day')
+                     ORDER BY timestamp LIMIT 1))
+        FROM dates
+        WHERE day IS NOT NULL
+    )
+    SELECT day FROM dates WHERE day IS NOT NULL
+"""
+FOLDER_DATES_SQL = DATES_SQL_TEMPLATE.format(folder_filter='folder = ?1 AND')
+ALL_DATES_SQL = DATES_SQL_TEMPLATE.format(folder_filter='')
+
+# Времена съёмки за один день [?2, ?3)
+TIMES_SQL_TEMPLATE = """
+    SELECT substr(timestamp, 12)
+    FROM photos
+    WHERE {folder_filter} timestamp >= ?2 AND timestamp < ?3
+    GROUP BY timestamp
+    ORDER BY timestamp
+"""
+FOLDER_TIMES_SQL = TIMES_SQL_TEMPLATE.format(folder_filter='folder = ?1 AND')
+# ?1 (папка) в запросе по всем папкам не используется, но передаётся, чтобы параметры были одни
+ALL_TIMES_SQL = TIMES_SQL_TEMPLATE.format(folder_filter='')
+
+# Последнее фото каждой папки не позже момента ?: папки перебираются прыжками по индексу,
+# для каждой - один поиск по (folder, timestamp), поэтому запрос не читает все фото до этого момента
+MAP_SNAPSHOT_SQL = """
+    WITH RECURSIVE folders(folder) AS (
+        SELECT (SELECT folder FROM photos ORDER BY folder LIMIT 1)
+        UNION ALL
+        SELECT (SELECT folder FROM photos WHERE folder > f.folder ORDER BY folder LIMIT 1)
+        FROM folders f
+        WHERE f.folder IS NOT NULL
+    )
+    SELECT p.folder, p.animal_count, p.unique_animal_count, p.timestamp
+    FROM folders f
+    JOIN photos p ON p.id = (
+        SELECT id FROM photos
+        WHERE folder = f.folder AND timestamp <= ?
+        ORDER BY timestamp DESC, id DESC
+        LIMIT 1
+    )
+"""
+
+# Keyset-пагинация: следующая страница начинается после (timestamp, id) последней строки
+PHOTOS_PAGE_SQL = f"""
+    SELECT {PHOTO_COLUMNS}
+    FROM photos
+    WHERE (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ? OFFSET ?
+"""
+
+PHOTOS_IN_FOLDER_PAGE_SQL = f"""
+    SELECT {PHOTO_COLUMNS}
+    FROM photos
+    WHERE folder = ? AND (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ? OFFSET ?
+"""
+
+PHOTOS_FOR_MAP_SQL = """
+    SELECT folder, animal_count, unique_animal_count
+    FROM photos
+    WHERE folder = ? AND timestamp <= ?
+    ORDER BY timestamp DESC
+    LIMIT 1
+"""
+
+PREVIOUS_PHOTO_SQL = """
+    SELECT timestamp, scene_id
+    FROM photos
+    WHERE folder = ? AND timestamp <= ?
+    ORDER BY timestamp DESC
+    LIMIT 1
+"""
+
+# Строки экспорта, по одной на сцену с животными. Класс сцены - тот, за который проголосовало
+# больше всего детекций (при равенстве - с большей суммарной уверенностью); class_counts -
+# "класс:число животных" по всем классам сцены. Число животных класса, как и count
+# (scenes.unique_animal_count), - максимум по кадрам сцены: id треков для этого не годятся,
+# одно животное после перерыва получает новый трек. {photo_filter} - дополнительное условие на photos.
+EXPORT_SQL_TEMPLATE = """
+    WITH scene_times AS (
+        SELECT folder, scene_id, MIN(timestamp) AS start, MAX(timestamp) AS end
+        FROM photos
+        WHERE animal_count > 0 AND scene_id IS NOT NULL {photo_filter}
+        GROUP BY folder, scene_id
+    ),
+    photo_classes AS (
+        SELECT d.scene_id, d.class_id, COUNT(*) AS animals, SUM(COALESCE(d.confidence, 0)) AS confidence
+        FROM detections d
+        WHERE d.scene_id IN (SELECT scene_id FROM scene_times)
+        GROUP BY d.scene_id, d.class_id, d.photo_id
+    ),
+    class_votes AS (
+        SELECT
+            scene_id,
+            class_id,
+            ROW_NUMBER() OVER (
+                PARTITION BY scene_id
+                ORDER BY SUM(animals) DESC, SUM(confidence) DESC, class_id
+            ) AS rank,
+            MAX(animals) AS animals
+        FROM photo_classes
+        GROUP BY scene_id, class_id
+    ),
+    scene_classes AS (
+        SELECT
+            scene_id,
+            MAX(CASE WHEN rank = 1 THEN name END) AS class,
+            group_concat(name || ':' || animals, ';') AS class_counts
+        FROM (
+            SELECT v.scene_id, v.rank, v.animals, c.name
+            FROM class_votes v
+            JOIN classes c ON c.id = v.class_id
+            ORDER BY v.scene_id, v.rank
+        )
+        GROUP BY scene_id
+    )
+    SELECT t.folder, COALESCE(sc.class, 'Unknown'), t.start, t.end, s.unique_animal_count, sc.class_counts
+    FROM scene_times t
+    JOIN scenes s ON s.id = t.scene_id
+    LEFT JOIN scene_classes sc ON sc.scene_id = t.scene_id
+    ORDER BY t.folder, t.start
+"""
+EXPORT_SQL = EXPORT_SQL_TEMPLATE.format(photo_filter='')
+EXPORT_IN_FOLDER_SQL = EXPORT_SQL_TEMPLATE.format(photo_filter='AND folder = ?')
+
+# Индексы под основные запросы фотобанка, карты и экспорта.
+# idx_photos_folder_timestamp покрывающий для запросов карты и списка времени
+QUERY_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_photos_folder_timestamp ON photos (folder, timestamp, animal_count, unique_animal_count)',
+    'CREATE INDEX IF NOT EXISTS idx_photos_timestamp ON photos (timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_photos_scene_timestamp ON photos (scene_id, timestamp)',
+]
+
+# id в индексе нужен, чтобы порядок (timestamp, id) для пагинации шёл по индексу без сортировки
+PAGING_INDEXES = [
+    'DROP INDEX IF EXISTS idx_photos_folder_timestamp',
+    'CREATE INDEX IF NOT EXISTS idx_photos_folder_timestamp_id ON photos (folder, timestamp, id, animal_count, unique_animal_count)',
+]
+
+# Колонки отпечатка файла: по ним повторная загрузка папки пропускает уже обработанные фото
+FINGERPRINT_COLUMNS = [
+    ('size', 'INTEGER'),
+    ('mtime_ns', 'INTEGER'),
+    ('content_hash', 'TEXT'),
+]
+
+# Сколько строк экспорта читать из курсора за раз
+EXPORT_FETCH_SIZE = 1000
+
+# Ключ, который больше любого (timestamp, id): с него начинается первая страница
+FIRST_PAGE_KEY = ('9999-12-31 23:59:59', 2 ** 63 - 1)
+
+# (описание, запрос, параметры, индекс, который должен использоваться)
+QUERY_PLAN_CHECKS = [
+    ('get_photos', PHOTOS_SQL, (), 'idx_photos_timestamp'),
+    ('get_photos(folder)', PHOTOS_IN_FOLDER_SQL, ('',), 'idx_photos_folder_timestamp_id'),
+    ('get_photos_page', PHOTOS_PAGE_SQL, FIRST_PAGE_KEY + (15, 0), 'idx_photos_timestamp'),
+    ('get_photos_page(folder)', PHOTOS_IN_FOLDER_PAGE_SQL, ('',) + FIRST_PAGE_KEY + (15, 0), 'idx_photos_folder_timestamp_id'),
+    ('get_last_photo_in_scene', LAST_PHOTO_IN_SCENE_SQL, (0,), 'idx_photos_scene_timestamp'),
+    ('get_timestamps_for_folder', TIMESTAMPS_FOR_FOLDER_SQL, ('',), 'idx_photos_folder_timestamp_id'),
+    ('get_photos_for_map', PHOTOS_FOR_MAP_SQL, ('', ''), 'idx_photos_folder_timestamp_id'),
+    ('get_folder_dates', FOLDER_DATES_SQL, ('',), 'idx_photos_folder_timestamp_id'),
+    ('get_folder_times', FOLDER_TIMES_SQL, ('', '', ''), 'idx_photos_folder_timestamp_id'),
+    ('get_folder_dates(all)', ALL_DATES_SQL, (), 'idx_photos_timestamp'),
+    ('get_folder_times(all)', ALL_TIMES_SQL, (None, '', ''), 'idx_photos_timestamp'),
+    ('get_map_snapshot', MAP_SNAPSHOT_SQL, ('',), 'idx_photos_folder_timestamp_id'),
+    ('get_previous_photo', PREVIOUS_PHOTO_SQL, ('', ''), 'idx_photos_folder_timestamp_id'),
+]
+
+# Экспорт группирует и сортирует сцены во временных B-деревьях - для него проверяется
+# только то, что детекции сцен выбираются по индексу, а не сканированием detections
+EXPORT_PLAN_CHECKS = [
+    ('iter_export_data', EXPORT_SQL, (), 'idx_detections_scene_class'),
+    ('iter_export_data(folder)', EXPORT_IN_FOLDER_SQL, ('',), 'idx_detections_scene_class'),
+]
+
+
+def load_labels(labels_path=DEFAULT_LABELS_PATH):
+    with open(labels_path, 'r') as f:
+        return [line.strip() for line in f.readlines()]
+
+
+def parse_class_threshold(text):
+    """'Tiger=0.3' -> ('Tiger', 0.3)."""
+    name, sep, value = text.partition('=')
+    if not sep or not name.strip():
+        raise ValueError(f"ожидается КЛАСС=ПОРОГ: {text}")
+    return name.strip(), float(value)
+
+
+def load_class_thresholds(thresholds_path=DEFAULT_THRESHOLDS_PATH):
+    """{класс: порог} из файла порогов; без файла - пустой словарь (у всех классов общий порог)."""
+    if not os.path.exists(thresholds_path):
+        return {}
+    thresholds = {}
+    with open(thresholds_path, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                name, value = parse_class_threshold(line)
+                thresholds[name] = value
+    return thresholds
+
+
+def format_animal_id(animal_id):
+    return f"animal_{animal_id}"
+
+
 class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect('animal_counter.db')
+    def __init__(self, db_path=DEFAULT_DB_PATH, labels_path=DEFAULT_LABELS_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30)
         self.cursor = self.conn.cursor()
+        self.configure_connection()
         self.create_tables()
+        if os.path.exists(labels_path):
+            self.sync_classes(load_labels(labels_path))
+        self.migrate()
+
+    def configure_connection(self):
+        # WAL: одна запись на транзакцию вместо двух, читатели не блокируют писателя.
+        # synchronous=NORMAL в режиме WAL безопасен при падении приложения
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.execute('PRAGMA synchronous=NORMAL')
+        self.cursor.execute('PRAGMA cache_size=-65536')  # 64 МБ
+        self.cursor.execute('PRAGMA temp_store=MEMORY')
 
     def create_tables(self):
         self.cursor.execute('''
@@ -29,33 +295,413 @@ class Database:
                 unique_animal_count INTEGER
             )
         ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS photo_timestamps (
+                path TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+        ''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_photo_timestamps_folder ON photo_timestamps (folder)')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS classes (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS detections (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                photo_id INTEGER NOT NULL,
+                scene_id INTEGER,
+                x1 INTEGER NOT NULL,
+                y1 INTEGER NOT NULL,
+                x2 INTEGER NOT NULL,
+                y2 INTEGER NOT NULL,
+                class_id INTEGER NOT NULL,
+                confidence REAL,
+                animal_id INTEGER
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS folder_settings (
+                folder TEXT PRIMARY KEY,
+                scene_gap_seconds INTEGER
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS import_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                folder TEXT NOT NULL,
+                finished_at TEXT NOT NULL,
+                processed INTEGER,
+                skipped INTEGER,
+                elapsed REAL,
+                cancelled INTEGER,
+                report TEXT
+            )
+        ''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_detections_photo ON detections (photo_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_detections_scene_class ON detections (scene_id, class_id)')
         self.conn.commit()
 
+    def sync_classes(self, labels):
+        # id класса совпадает с индексом в labels.txt и выходом модели
+        with self.conn:
+            self.cursor.executemany('INSERT OR IGNORE INTO classes (id, name) VALUES (?, ?)', list(enumerate(labels)))
+
+    def get_class_ids(self):
+        self.cursor.execute('SELECT name, id FROM classes')
+        return dict(self.cursor.fetchall())
+
+    def migrations(self):
+        # Версия схемы хранится в PRAGMA user_version; новые шаги добавляются в конец
+        return [
+            self.migrate_bbox_strings,
+            self.create_query_indexes,
+            self.create_paging_indexes,
+            self.add_photo_fingerprints,
+        ]
+
+    def migrate(self):
+        version = self.cursor.execute('PRAGMA user_version').fetchone()[0]
+        for target_version, migration in enumerate(self.migrations(), start=1):
+            if version < target_version:
+                migration()
+                self.cursor.execute(f'PRAGMA user_version = {target_version}')
+                self.conn.commit()
+
+    def create_query_indexes(self):
+        with self.conn:
+            for statement in QUERY_INDEXES:
+                self.cursor.execute(statement)
+        self.cursor.execute('ANALYZE')
+
+    def create_paging_indexes(self):
+        with self.conn:
+            for statement in PAGING_INDEXES:
+                self.cursor.execute(statement)
+        self.cursor.execute('ANALYZE')
+
+    def add_photo_fingerprints(self):
+        """Уникальный путь фото и отпечаток файла для инкрементальной загрузки.
+
+        Дубликаты, которые появлялись при повторной загрузке папки, удаляются:
+        остаётся последняя запись по каждому пути.
+        """
+        columns = {row[1] for row in self.cursor.execute('PRAGMA table_info(photos)')}
+        with self.conn:
+            self.cursor.execute('''
+                CREATE TEMP TABLE duplicate_photos AS
+                SELECT id FROM photos
+                WHERE id NOT IN (SELECT MAX(id) FROM photos GROUP BY path)
+            ''')
+            self.cursor.execute('DELETE FROM detections WHERE photo_id IN (SELECT id FROM duplicate_photos)')
+            self.cursor.execute('DELETE FROM photos WHERE id IN (SELECT id FROM duplicate_photos)')
+            self.cursor.execute('DROP TABLE duplicate_photos')
+            self.cursor.execute('DELETE FROM scenes WHERE id NOT IN (SELECT scene_id FROM photos WHERE scene_id IS NOT NULL)')
+            for name, column_type in FINGERPRINT_COLUMNS:
+                if name not in columns:
+                    self.cursor.execute(f'ALTER TABLE photos ADD COLUMN {name} {column_type}')
+            self.cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_photos_path ON photos (path)')
+
+    def explain_query_plan(self, query, params=()):
+        self.cursor.execute('EXPLAIN QUERY PLAN ' + query, params)
+        return [row[3] for row in self.cursor.fetchall()]
+
+    def check_query_plans(self):
+        """Проверяет, что основные запросы идут по индексам, а не полным сканированием photos и detections.
+
+        Возвращает {описание: план}; при нарушении бросает AssertionError.
+        """
+        plans = {}
+        for name, query, params, index in QUERY_PLAN_CHECKS:
+            plan = self.explain_query_plan(query, params)
+            plans[name] = plan
+            assert any(index in step for step in plan), f"{name}: не используется {index}: {plan}"
+            assert not any('TEMP B-TREE' in step for step in plan), f"{name}: сортировка без индекса: {plan}"
+        for name, query, params, index in EXPORT_PLAN_CHECKS:
+            plan = self.explain_query_plan(query, params)
+            plans[name] = plan
+            assert any(index in step for step in plan), f"{name}: не используется {index}: {plan}"
+        return plans
+
+    def migrate_bbox_strings(self):
+        """Переносит детекции из старого столбца photos.bbox_string в таблицу detections."""
+        self.cursor.execute('''
+            SELECT id, scene_id, bbox_string
+            FROM photos
+            WHERE bbox_string IS NOT NULL AND bbox_string != ''
+        ''')
+        rows = self.cursor.fetchall()
+        if not rows:
+            return
+
+        class_ids = self.get_class_ids()
+        detections = []
+        for photo_id, scene_id, bbox_string in rows:
+            for bbox in bbox_string.split(";"):
+                parts = bbox.split(",")
+                if len(parts) < 6:
+                    continue
+                x1, y1, x2, y2 = map(int, parts[:4])
+                animal_id, category = parts[4], parts[5]
+                if category not in class_ids:
+                    self.cursor.execute('INSERT INTO classes (id, name) VALUES ((SELECT COALESCE(MAX(id), -1) + 1 FROM classes), ?)', (category,))
+                    class_ids[category] = self.cursor.execute('SELECT id FROM classes WHERE name = ?', (category,)).fetchone()[0]
+                animal_number = animal_id.rsplit("_", 1)[-1]
+                detections.append((photo_id, scene_id, x1, y1, x2, y2, class_ids[category], None,
+                                   int(animal_number) if animal_number.isdigit() else None))
+
+        with self.conn:
+            self.cursor.executemany('''
+                INSERT INTO detections (photo_id, scene_id, x1, y1, x2, y2, class_id, confidence, animal_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', detections)
+            self.cursor.execute("UPDATE photos SET bbox_string = NULL WHERE bbox_string IS NOT NULL")
+
     def get_photo(self, photo_id):
         self.cursor.execute("""
-            SELECT id, path, folder, upload_date, processed, scene_id, animal_count, unique_animal_count, timestamp, bbox_string
+            SELECT id, path, folder, upload_date, processed, scene_id, animal_count, unique_animal_count, timestamp
             FROM photos 
             WHERE id = ?
         """, (photo_id,))
         return self.cursor.fetchone()
 
-    def add_photo(self, path, timestamp):
-        upload_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        folder = os.path.dirname(path)
+    def get_cached_timestamps(self, folder):
+        """Кэш времени съёмки для папки: {path: (size, mtime_ns, timestamp)}."""
         self.cursor.execute('''
-            INSERT INTO photos (path, folder, upload_date, timestamp)
-            VALUES (?, ?, ?, ?)
-        ''', (path, folder, upload_date, timestamp))
+            SELECT path, size, mtime_ns, timestamp
+            FROM photo_timestamps
+            WHERE folder = ?
+        ''', (folder,))
+        return {
+            path: (size, mtime_ns, datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S'))
+            for path, size, mtime_ns, timestamp in self.cursor.fetchall()
+        }
+
+    def save_cached_timestamps(self, rows):
+        """rows: итерируемое из (path, size, mtime_ns, timestamp)."""
+        self.cursor.executemany('''
+            INSERT OR REPLACE INTO photo_timestamps (path, folder, size, mtime_ns, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (path, os.path.dirname(path), size, mtime_ns, timestamp.strftime("%Y-%m-%d %H:%M:%S"))
+            for path, size, mtime_ns, timestamp in rows
+        ])
         self.conn.commit()
-        return self.cursor.lastrowid
 
-    def update_photo_processing(self, photo_id, scene_id, animal_count, unique_animal_count, bbox_string, timestamp):
+    def get_photo_ids(self, paths):
+        """{path: (photo_id, scene_id)} для тех из paths, что уже есть в базе."""
+        photo_ids = {}
+        # Не больше 999 параметров в запросе для старых сборок SQLite
+        for start in range(0, len(paths), 900):
+            chunk = paths[start:start + 900]
+            self.cursor.execute(f'''
+                SELECT path, id, scene_id
+                FROM photos
+                WHERE path IN ({','.join('?' * len(chunk))})
+            ''', chunk)
+            for path, photo_id, scene_id in self.cursor.fetchall():
+                photo_ids[path] = (photo_id, scene_id)
+        return photo_ids
+
+    def add_scenes(self, scenes):
+        """Записывает сцены с фотографиями и детекциями одной транзакцией.
+
+        scenes: список (unique_animal_count, photos), где photo - словарь с ключами
+        path, timestamp, animal_count и detections - списком кортежей
+        (x1, y1, x2, y2, class_id, confidence, animal_id), и необязательным
+        fingerprint - (size, mtime_ns, content_hash). Фото, которые уже есть в базе
+        (путь уникален), обновляются на месте вместе с детекциями, а их прежние сцены,
+        оставшиеся без фото, удаляются. Возвращает id созданных сцен.
+        """
+        upload_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        scene_ids = []
+        with self.conn:
+            replaced_scene_ids = set()
+            for unique_animal_count, photos in scenes:
+                self.cursor.execute('INSERT INTO scenes (unique_animal_count) VALUES (?)', (unique_animal_count,))
+                scene_id = self.cursor.lastrowid
+                scene_ids.append(scene_id)
+                rows = [(photo['path'], (scene_id, photo['animal_count'], unique_animal_count,
+                                          photo['timestamp'].strftime("%Y-%m-%d %H:%M:%S")) +
+                         tuple(photo.get('fingerprint') or (None, None, None))) for photo in photos]
+                existing = self.get_photo_ids([path for path, _ in rows])
+                replaced_scene_ids.update(old_scene_id for _, old_scene_id in existing.values())
+                # Отпечаток не передаётся для фото, которые только перегруппированы - его не трогаем
+                self.cursor.executemany('''
+                    UPDATE photos
+                    SET processed = 1, scene_id = ?, animal_count = ?, unique_animal_count = ?, timestamp = ?,
+                        size = COALESCE(?, size), mtime_ns = COALESCE(?, mtime_ns),
+                        content_hash = COALESCE(?, content_hash)
+                    WHERE id = ?
+                ''', [values + (existing[path][0],) for path, values in rows if path in existing])
+                self.cursor.executemany('DELETE FROM detections WHERE photo_id = ?',
+                                        [(photo_id,) for photo_id, _ in existing.values()])
+                self.cursor.executemany('''
+                    INSERT INTO photos (path, folder, upload_date, processed, scene_id, animal_count,
+                                        unique_animal_count, timestamp, size, mtime_ns, content_hash)
+                    VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(path, os.path.dirname(path), upload_date) + values
+                      for path, values in rows if path not in existing])
+                # id вставленных фото - одним запросом, а не lastrowid после каждой вставки
+                if len(existing) < len(rows):
+                    existing = self.get_photo_ids([path for path, _ in rows])
+                detections = [(existing[photo['path']][0], scene_id) + tuple(detection)
+                              for photo in photos for detection in photo['detections']]
+                self.cursor.executemany('''
+                    INSERT INTO detections (photo_id, scene_id, x1, y1, x2, y2, class_id, confidence, animal_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', detections)
+            replaced_scene_ids.discard(None)
+            self.cursor.executemany('''
+                DELETE FROM scenes
+                WHERE id = ? AND NOT EXISTS (SELECT 1 FROM photos WHERE scene_id = scenes.id)
+            ''', [(scene_id,) for scene_id in replaced_scene_ids])
+        return scene_ids
+
+    def get_photo_fingerprints(self, folder):
+        """Отпечатки обработанных фото папки: {path: (size, mtime_ns, content_hash)}."""
         self.cursor.execute('''
-            UPDATE photos
-            SET processed = 1, scene_id = ?, animal_count = ?, unique_animal_count = ?, bbox_string = ?, timestamp = ?
-            WHERE id = ?
-        ''', (scene_id, animal_count, unique_animal_count, bbox_string, timestamp.strftime("%Y-%m-%d %H:%M:%S"), photo_id))
-        self.conn.commit()
+            SELECT path, size, mtime_ns, content_hash
+            FROM photos
+            WHERE folder = ? AND processed = 1
+        ''', (folder,))
+        return {path: (size, mtime_ns, content_hash) for path, size, mtime_ns, content_hash in self.cursor.fetchall()}
+
+    def update_photo_fingerprints(self, rows):
+        """rows: итерируемое из (path, size, mtime_ns, content_hash) для фото, чьё содержимое не изменилось."""
+        with self.conn:
+            self.cursor.executemany(
+                'UPDATE photos SET size = ?, mtime_ns = ?, content_hash = ? WHERE path = ?',
+                [(size, mtime_ns, content_hash, path) for path, size, mtime_ns, content_hash in rows]
+            )
+
+    def get_previous_photo(self, folder, timestamp):
+        """Время и сцена последнего фото папки, снятого не позже timestamp, или None."""
+        self.cursor.execute(PREVIOUS_PHOTO_SQL, (folder, timestamp.strftime('%Y-%m-%d %H:%M:%S')))
+        row = self.cursor.fetchone()
+        return (datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S'), row[1]) if row else None
+
+    def get_scene_start(self, scene_id):
+        self.cursor.execute('SELECT MIN(timestamp) FROM photos WHERE scene_id = ?', (scene_id,))
+        row = self.cursor.fetchone()
+        return datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S') if row and row[0] else None
+
+    def get_folder_detections(self, folder, since):
+        """Обработанные фото папки начиная с since с их детекциями, в порядке времени съёмки.
+
+        Возвращает список (path, timestamp, detections), detections - список
+        (x1, y1, x2, y2, class_id, confidence). Нужен, чтобы перегруппировать
+        сцены без повторной детекции.
+        """
+        self.cursor.execute('''
+            SELECT p.id, p.path, p.timestamp, d.x1, d.y1, d.x2, d.y2, d.class_id, d.confidence
+            FROM photos p
+            LEFT JOIN detections d ON d.photo_id = p.id
+            WHERE p.folder = ? AND p.timestamp >= ? AND p.processed = 1
+            ORDER BY p.timestamp, p.id, d.id
+        ''', (folder, since.strftime('%Y-%m-%d %H:%M:%S')))
+        photos = []
+        last_id = None
+        for photo_id, path, timestamp, x1, y1, x2, y2, class_id, confidence in self.cursor.fetchall():
+            if photo_id != last_id:
+                photos.append((path, datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S'), []))
+                last_id = photo_id
+            if x1 is not None:
+                photos[-1][2].append((x1, y1, x2, y2, class_id, confidence))
+        return photos
+
+    def get_scene_gap(self, folder):
+        """Промежуток между сценами, заданный для папки, или None."""
+        self.cursor.execute('SELECT scene_gap_seconds FROM folder_settings WHERE folder = ?', (folder,))
+        row = self.cursor.fetchone()
+        return timedelta(seconds=row[0]) if row and row[0] is not None else None
+
+    def set_scene_gap(self, folder, scene_gap):
+        with self.conn:
+            self.cursor.execute('''
+                INSERT OR REPLACE INTO folder_settings (folder, scene_gap_seconds) VALUES (?, ?)
+            ''', (folder, int(scene_gap.total_seconds())))
+
+    def add_import_run(self, stats):
+        """Сохраняет статистику загрузки папки; report (замеры стадий) хранится как JSON."""
+        with self.conn:
+            self.cursor.execute('''
+                INSERT INTO import_runs (folder, finished_at, processed, skipped, elapsed, cancelled, report)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (stats['folder'], datetime.now().strftime('%Y-%m-%d %H:%M:%S'), stats['processed'],
+                  stats['skipped'], stats['elapsed'], int(stats['cancelled']),
+                  json.dumps(stats.get('report'), ensure_ascii=False)))
+            return self.cursor.lastrowid
+
+    def get_import_runs(self, folder=None, limit=20):
+        """Последние загрузки: (id, folder, finished_at, processed, skipped, elapsed, cancelled, report)."""
+        self.cursor.execute('''
+            SELECT id, folder, finished_at, processed, skipped, elapsed, cancelled, report
+            FROM import_runs
+            WHERE ? IS NULL OR folder = ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (folder, folder, limit))
+        return [row[:7] + (json.loads(row[7]) if row[7] else None,) for row in self.cursor.fetchall()]
+
+    def get_folder_scene_rows(self, folder):
+        """(id, timestamp, scene_id) фото папки в порядке времени съёмки."""
+        self.cursor.execute('''
+            SELECT id, timestamp, scene_id
+            FROM photos
+            WHERE folder = ? AND processed = 1
+            ORDER BY timestamp, id
+        ''', (folder,))
+        return self.cursor.fetchall()
+
+    def get_detections_for_photos(self, photo_ids):
+        """{photo_id: [(detection_id, x1, y1, x2, y2), ...]} в порядке детекций."""
+        detections = {}
+        # Не больше 999 параметров в запросе для старых сборок SQLite
+        for start in range(0, len(photo_ids), 900):
+            chunk = photo_ids[start:start + 900]
+            self.cursor.execute(f'''
+                SELECT photo_id, id, x1, y1, x2, y2
+                FROM detections
+                WHERE photo_id IN ({','.join('?' * len(chunk))})
+                ORDER BY id
+            ''', chunk)
+            for photo_id, detection_id, x1, y1, x2, y2 in self.cursor.fetchall():
+                detections.setdefault(photo_id, []).append((detection_id, x1, y1, x2, y2))
+        return detections
+
+    def rewrite_scenes(self, scenes, old_scene_ids=()):
+        """Переназначает уже сохранённые фото новым сценам одной транзакцией.
+
+        scenes: список (unique_animal_count, photo_ids, animal_ids), где
+        animal_ids - [(animal_id, detection_id)]. Как и в add_scenes,
+        unique_animal_count фото - значение всей сцены.
+        Сцены из old_scene_ids, оставшиеся без фото, удаляются.
+        """
+        with self.conn:
+            for unique_animal_count, photo_ids, animal_ids in scenes:
+                self.cursor.execute('INSERT INTO scenes (unique_animal_count) VALUES (?)', (unique_animal_count,))
+                scene_id = self.cursor.lastrowid
+                self.cursor.executemany(
+                    'UPDATE photos SET scene_id = ?, unique_animal_count = ? WHERE id = ?',
+                    [(scene_id, unique_animal_count, photo_id) for photo_id in photo_ids]
+                )
+                self.cursor.executemany(
+                    'UPDATE detections SET scene_id = ? WHERE photo_id = ?',
+                    [(scene_id, photo_id) for photo_id in photo_ids]
+                )
+                self.cursor.executemany(
+                    'UPDATE detections SET animal_id = ? WHERE id = ?', animal_ids
+                )
+            self.cursor.executemany('''
+                DELETE FROM scenes
+                WHERE id = ? AND NOT EXISTS (SELECT 1 FROM photos WHERE scene_id = scenes.id)
+            ''', [(scene_id,) for scene_id in old_scene_ids])
 
     def get_unique_folders(self):
         self.cursor.execute("SELECT DISTINCT folder FROM photos")
@@ -63,30 +709,41 @@ class Database:
 
     def get_photos(self, folder=None):
         if folder:
-            self.cursor.execute("""
-                SELECT id, path, folder, upload_date, processed, scene_id, animal_count, unique_animal_count, timestamp
-                FROM photos 
-                WHERE folder = ? 
-                ORDER BY timestamp DESC
-            """, (folder,))
+            self.cursor.execute(PHOTOS_IN_FOLDER_SQL, (folder,))
         else:
-            self.cursor.execute("""
-                SELECT id, path, folder, upload_date, processed, scene_id, animal_count, unique_animal_count, timestamp
-                FROM photos 
-                ORDER BY timestamp DESC
-            """)
+            self.cursor.execute(PHOTOS_SQL)
         return self.cursor.fetchall()
 
-    def get_bounding_boxes(self, photo_id):
-        self.cursor.execute('SELECT x1, y1, x2, y2, animal_id, category FROM bounding_boxes WHERE photo_id = ?', (photo_id,))
+    def count_photos(self, folder=None):
+        if folder:
+            self.cursor.execute("SELECT COUNT(*) FROM photos WHERE folder = ?", (folder,))
+        else:
+            self.cursor.execute("SELECT COUNT(*) FROM photos")
+        return self.cursor.fetchone()[0]
+
+    def get_photos_page(self, folder=None, after=None, limit=15, offset=0):
+        """Страница фото в порядке (timestamp, id) по убыванию.
+
+        after - (timestamp, id) последней строки предыдущей страницы, None - с начала.
+        offset позволяет перескочить несколько страниц от известного ключа.
+        """
+        key = tuple(after) if after else FIRST_PAGE_KEY
+        if folder:
+            self.cursor.execute(PHOTOS_IN_FOLDER_PAGE_SQL, (folder,) + key + (limit, offset))
+        else:
+            self.cursor.execute(PHOTOS_PAGE_SQL, key + (limit, offset))
         return self.cursor.fetchall()
 
-    def update_scene_unique_count(self, scene_id, unique_count):
+    def get_bounding_boxes(self, photo_id):
         self.cursor.execute('''
-            INSERT OR REPLACE INTO scenes (id, unique_animal_count)
-            VALUES (?, ?)
-        ''', (scene_id, unique_count))
-        self.conn.commit()
+            SELECT d.x1, d.y1, d.x2, d.y2, d.animal_id, c.name
+            FROM detections d
+            JOIN classes c ON c.id = d.class_id
+            WHERE d.photo_id = ?
+            ORDER BY d.id
+        ''', (photo_id,))
+        return [(x1, y1, x2, y2, format_animal_id(animal_id), category)
+                for x1, y1, x2, y2, animal_id, category in self.cursor.fetchall()]
 
     def get_scene_unique_count(self, scene_id):
         self.cursor.execute('SELECT unique_animal_count FROM scenes WHERE id = ?', (scene_id,))
@@ -94,36 +751,34 @@ class Database:
         return result[0] if result else None
     
     def get_last_photo_in_scene(self, scene_id):
-        self.cursor.execute('''
-            SELECT * FROM photos 
-            WHERE scene_id = ? 
-            ORDER BY timestamp DESC 
-            LIMIT 1
-        ''', (scene_id,))
+        self.cursor.execute(LAST_PHOTO_IN_SCENE_SQL, (scene_id,))
         return self.cursor.fetchone()
 
-    def create_new_scene(self):
-        self.cursor.execute('INSERT INTO scenes (unique_animal_count) VALUES (0)')
-        self.conn.commit()
-        return self.cursor.lastrowid
-    
     def get_timestamps_for_folder(self, folder):
-        self.cursor.execute("""
-            SELECT timestamp
-            FROM photos
-            WHERE folder = ?
-            ORDER BY timestamp
-        """, (folder,))
+        self.cursor.execute(TIMESTAMPS_FOR_FOLDER_SQL, (folder,))
         return [datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S') for row in self.cursor.fetchall()]
 
+    def get_folder_dates(self, folder):
+        """Даты съёмки папки (None - всех папок) по возрастанию, строки 'YYYY-MM-DD'."""
+        if folder is None:
+            self.cursor.execute(ALL_DATES_SQL)
+        else:
+            self.cursor.execute(FOLDER_DATES_SQL, (folder,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_folder_times(self, folder, day):
+        """Различные времена съёмки папки (None - всех папок) за день day ('YYYY-MM-DD'), строки 'HH:MM:SS'."""
+        next_day = (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        self.cursor.execute(ALL_TIMES_SQL if folder is None else FOLDER_TIMES_SQL, (folder, day, next_day))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_data_version(self):
+        """PRAGMA data_version: меняется, когда базу изменило другое подключение (например, поток загрузки)."""
+        self.cursor.execute('PRAGMA data_version')
+        return self.cursor.fetchone()[0]
+
     def get_photos_for_map(self, folder, selected_datetime):
-        self.cursor.execute("""
-            SELECT folder, animal_count, unique_animal_count
-            FROM photos
-            WHERE folder = ? AND timestamp <= ?
-            ORDER BY timestamp DESC
-            LIMIT 1
-        """, (folder, selected_datetime.strftime('%Y-%m-%d %H:%M:%S')))
+        self.cursor.execute(PHOTOS_FOR_MAP_SQL, (folder, selected_datetime.strftime('%Y-%m-%d %H:%M:%S')))
         result = self.cursor.fetchone()
         if result:
             return [{
@@ -133,53 +788,55 @@ class Database:
             }]
         return []
     
-    def get_export_data(self, folder=None):
-        query = """
-            SELECT 
-                p.folder,
-                p.bbox_string,
-                MIN(p.timestamp) as date_registration_start,
-                MAX(p.timestamp) as date_registration_end,
-                s.unique_animal_count as count
-            FROM 
-                photos p
-            JOIN 
-                scenes s ON p.scene_id = s.id
-            WHERE 
-                p.bbox_string IS NOT NULL AND p.bbox_string != ''
+    def get_map_snapshot(self, selected_datetime):
+        """Последнее фото каждой папки не позже selected_datetime - все камеры одним запросом."""
+        self.cursor.execute(MAP_SNAPSHOT_SQL, (selected_datetime.strftime('%Y-%m-%d %H:%M:%S'),))
+        return [{
+            'folder': folder,
+            'animal_count': animal_count,
+            'unique_animal_count': unique_animal_count,
+            'timestamp': timestamp
+        } for folder, animal_count, unique_animal_count, timestamp in self.cursor.fetchall()]
+
+    def iter_export_data(self, folder=None):
+        """Строки экспорта (folder, class, start, end, count, class_counts) по одной сцене.
+
+        Класс сцены и число животных по классам считаются в SQL (см. EXPORT_SQL_TEMPLATE).
+        Курсор читается частями по EXPORT_FETCH_SIZE, поэтому память не зависит от размера
+        архива. Время - строки 'YYYY-MM-DD HH:MM:SS'. Курсор отдельный: пока генератор
+        не исчерпан, другие запросы через self.cursor не мешают выгрузке.
         """
-        
-        if folder:
-            query += " AND p.folder = ?"
-            query += " GROUP BY p.folder, p.scene_id"
-            self.cursor.execute(query, (folder,))
-        else:
-            query += " GROUP BY p.folder, p.scene_id"
-            self.cursor.execute(query)
-        
-        results = self.cursor.fetchall()
-        
-        processed_results = []
-        for row in results:
-            folder, bbox_string, start, end, count = row
-            
-            # Extract class from bbox_string
-            bboxes = bbox_string.split(";")
-            if bboxes:
-                # Take the class from the first bounding box
-                class_name = bboxes[0].split(",")[5] if len(bboxes[0].split(",")) > 5 else "Unknown"
+        cursor = self.conn.cursor()
+        try:
+            if folder:
+                cursor.execute(EXPORT_IN_FOLDER_SQL, (folder,))
             else:
-                class_name = "Unknown"
-            
-            processed_results.append((
-                folder,
-                class_name,
-                datetime.strptime(start, '%Y-%m-%d %H:%M:%S'),
-                datetime.strptime(end, '%Y-%m-%d %H:%M:%S'),
-                count
-            ))
-        
-        return processed_results
+                cursor.execute(EXPORT_SQL)
+            while True:
+                rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def count_export_rows(self, folder=None):
+        """Сколько строк вернёт iter_export_data - для индикатора прогресса."""
+        query = "SELECT COUNT(DISTINCT scene_id) FROM photos WHERE animal_count > 0 AND scene_id IS NOT NULL"
+        params = ()
+        if folder:
+            query += " AND folder = ?"
+            params = (folder,)
+        self.cursor.execute(query, params)
+        return self.cursor.fetchone()[0]
 
     def __del__(self):
         self.conn.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    db = Database(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB_PATH)
+    for name, plan in db.check_query_plans().items():
+        print(f"{name}: {' / '.join(plan)}")
@@ -0,0 +1,137 @@
+import time
+
+import numpy as np
+import onnxruntime
+from preprocessing import read_image, letterbox, fill_tensor, inverse_transforms
+from postprocess import (postprocess_batch, class_thresholds, DEFAULT_CONFIDENCE_THRESHOLD,
+                         DEFAULT_IOU_THRESHOLD, DEFAULT_TOP_K)
+
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_INPUT_SIZE = 1024
+
+
+class YoloDetector:
+    def __init__(self, model_path, labels, batch_size=DEFAULT_BATCH_SIZE, input_size=DEFAULT_INPUT_SIZE,
+                 confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD, class_confidence_thresholds=None, iou_threshold=DEFAULT_IOU_THRESHOLD,
+                 top_k=DEFAULT_TOP_K, providers=None, session_options=None):
+        self.session = onnxruntime.InferenceSession(
+            model_path,
+            sess_options=session_options,
+            providers=providers or ['CPUExecutionProvider']
+        )
+        self.labels = labels
+        self.input_size = input_size
+        # Пороги по классам: class_confidence_thresholds = {'Tiger': 0.3, ...}, остальным - confidence_threshold
+        self.thresholds = class_thresholds(labels, class_confidence_thresholds, confidence_threshold)
+        self.iou_threshold = iou_threshold
+        self.top_k = top_k
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+
+        # Если батч-размерность в модели фиксирована (старый экспорт best.onnx),
+        # прогоняем изображения по одному. См. make_batch_dynamic.
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        self.batch_size = max(1, batch_size) if self.dynamic_batch else model_input.shape[0]
+
+        # Входной тензор выделяется один раз и переиспользуется для каждой пачки
+        self.input_buffer = np.empty((self.batch_size, 3, input_size, input_size), dtype=np.float32)
+
+    def read_image(self, path):
+        """Декодирует файл не крупнее, чем нужно модели. Возвращает (image, source_size)."""
+        return read_image(path, self.input_size)
+
+    def preprocess(self, image, canvas=None, source_size=None):
+        """Letterbox BGR-изображения в квадрат модели. Возвращает (canvas, LetterboxInfo)."""
+        return letterbox(image, self.input_size, canvas, source_size)
+
+    def detect_batch(self, canvases, infos, metrics=None):
+        """Прогоняет подготовленные letterbox-изображения через модель пачками по batch_size.
+
+        Возвращает по одному postprocess.Detections на каждое входное изображение.
+        metrics - instrumentation.Instrumentation для замеров стадий.
+        """
+        results = []
+        for start in range(0, len(canvases), self.batch_size):
+            chunk = canvases[start:start + self.batch_size]
+            chunk_infos = infos[start:start + self.batch_size]
+            begin = time.perf_counter()
+            for slot, canvas in enumerate(chunk):
+                fill_tensor(canvas, self.input_buffer[slot])
+            filled = time.perf_counter()
+            outputs = self.session.run([self.output_name], {self.input_name: self.input_buffer[:len(chunk)]})[0]
+            inferred = time.perf_counter()
+            image_sizes = [(info.width, info.height) for info in chunk_infos]
+            results.extend(postprocess_batch(outputs, inverse_transforms(chunk_infos), image_sizes, self.thresholds,
+                                             self.iou_threshold, self.top_k))
+            if metrics is not None:
+                metrics.record('fill_tensor', filled - begin)
+                metrics.record('session_run', inferred - filled)
+                metrics.record('postprocess', time.perf_counter() - inferred)
+                metrics.count('batches')
+        return results
+
+    def end_profiling(self):
+        """Останавливает профилирование ONNX Runtime и возвращает путь к JSON-трейсу."""
+        return self.session.end_profiling()
+
+
+def make_session_options(intra_op_threads=0, inter_op_threads=0, profile_prefix=None):
+    """Настройки сессии с заданным числом потоков (0 - решает ONNX Runtime).
+
+    Нужны, когда в нескольких процессах работают свои сессии: по умолчанию
+    каждая занимает все ядра, и процессы мешают друг другу.
+    profile_prefix включает профилирование ONNX Runtime: трейс пишется в
+    <profile_prefix>_<время>.json, путь возвращает YoloDetector.end_profiling.
+    """
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    if profile_prefix:
+        options.enable_profiling = True
+        options.profile_file_prefix = profile_prefix
+    return options
+
+
+def make_batch_dynamic(model_path, output_path=None, dim_name='batch'):
+    """Переписывает первую размерность входов и выходов модели на символьную,
+    чтобы InferenceSession принимал пачки произвольного размера."""
+    import onnx
+
+    model = onnx.load(model_path)
+    for value in list(model.graph.input) + list(model.graph.output):
+        dims = value.type.tensor_type.shape.dim
+        if dims:
+            dims[0].ClearField('dim_value')
+            dims[0].dim_param = dim_name
+    onnx.checker.check_model(model)
+    check_batch(model.SerializeToString())
+    onnx.save(model, output_path or model_path)
+
+
+def check_batch(model, batch_size=2):
+    """Пробный прогон пачки из batch_size нулевых изображений.
+
+    Символьная батч-размерность на входе ещё не значит, что граф её поддерживает:
+    Reshape с зашитой единицей падает только на пачке больше одного кадра.
+    """
+    try:
+        session = onnxruntime.InferenceSession(model, providers=['CPUExecutionProvider'])
+        model_input = session.get_inputs()[0]
+        shape = [batch_size] + [dim if isinstance(dim, int) else DEFAULT_INPUT_SIZE for dim in model_input.shape[1:]]
+        output = session.run(None, {model_input.name: np.zeros(shape, dtype=np.float32)})[0]
+    except Exception as e:
+        raise ValueError(f"модель не работает с пачкой из {batch_size} изображений: {e}") from e
+    if output.shape[0] != batch_size:
+        raise ValueError(f"на пачку из {batch_size} изображений модель вернула {output.shape[0]} результатов")
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Использование: python detector.py models/best.onnx [output.onnx]")
+        sys.exit(1)
+    make_batch_dynamic(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
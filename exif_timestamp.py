@@ -0,0 +1,99 @@
+import struct
+from datetime import datetime
+
+# Теги EXIF с датой съёмки
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+
+EXIF_DATETIME_FORMAT = '%Y:%m:%d %H:%M:%S'
+
+# Маркеры JPEG без поля длины
+_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+_SOS = 0xDA
+_APP1 = 0xE1
+
+
+def read_exif_timestamp(file_path):
+    """Читает дату съёмки из EXIF, не декодируя изображение.
+
+    Из файла читаются только заголовки сегментов до APP1 (обычно первые
+    несколько килобайт). Приоритет: DateTimeOriginal, DateTime, DateTimeDigitized.
+    Возвращает None, если это не JPEG или даты в EXIF нет.
+    """
+    with open(file_path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            header = f.read(2)
+            if len(header) < 2 or header[0] != 0xFF:
+                return None
+            marker = header[1]
+            if marker == 0xFF:
+                # Заполняющие байты между сегментами
+                f.seek(-1, 1)
+                continue
+            if marker in _STANDALONE_MARKERS:
+                continue
+            if marker == _SOS:
+                return None
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None
+            length = struct.unpack('>H', length_bytes)[0]
+            if marker == _APP1:
+                segment = f.read(length - 2)
+                if segment[:6] == b'Exif\x00\x00':
+                    return parse_tiff_timestamp(segment[6:])
+            else:
+                f.seek(length - 2, 1)
+
+
+def parse_tiff_timestamp(tiff):
+    if len(tiff) < 8:
+        return None
+    byte_order = tiff[:2]
+    if byte_order == b'II':
+        endian = '<'
+    elif byte_order == b'MM':
+        endian = '>'
+    else:
+        return None
+
+    ifd0_offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+    ifd0 = _read_ifd(tiff, ifd0_offset, endian)
+    exif_ifd = {}
+    if TAG_EXIF_IFD in ifd0:
+        exif_ifd = _read_ifd(tiff, ifd0[TAG_EXIF_IFD][1], endian)
+
+    for tags, tag in ((exif_ifd, TAG_DATETIME_ORIGINAL), (ifd0, TAG_DATETIME), (exif_ifd, TAG_DATETIME_DIGITIZED)):
+        if tag in tags:
+            value = _read_ascii(tiff, tags[tag])
+            try:
+                return datetime.strptime(value, EXIF_DATETIME_FORMAT)
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def _read_ifd(tiff, offset, endian):
+    """Возвращает {tag: (count, value_or_offset, raw_value_bytes)} для записей IFD."""
+    entries = {}
+    if offset + 2 > len(tiff):
+        return entries
+    count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+    for i in range(count):
+        start = offset + 2 + i * 12
+        if start + 12 > len(tiff):
+            break
+        tag, _, value_count = struct.unpack(endian + 'HHI', tiff[start:start + 8])
+        value_offset = struct.unpack(endian + 'I', tiff[start + 8:start + 12])[0]
+        entries[tag] = (value_count, value_offset, tiff[start + 8:start + 12])
+    return entries
+
+
+def _read_ascii(tiff, entry):
+    value_count, value_offset, raw = entry
+    data = raw[:value_count] if value_count <= 4 else tiff[value_offset:value_offset + value_count]
+    return data.split(b'\x00', 1)[0].decode('ascii', errors='ignore').strip()
@@ -0,0 +1,51 @@
+import os
+import threading
+import traceback
+from PyQt6.QtCore import QThread, pyqtSignal
+from database import Database
+from exporter import export_file
+
+
+class ExportWorker(QThread):
+    """Выгрузка сцен в CSV/XLSX в фоновом потоке со своим подключением к базе.
+
+    Строки читаются из курсора и пишутся в файл по одной, поэтому ни память,
+    ни отзывчивость GUI не зависят от размера архива.
+    """
+
+    progress = pyqtSignal(int, int)          # выгружено строк, всего
+    finished_export = pyqtSignal(str, int)   # файл, число строк
+    failed = pyqtSignal(str, str)            # файл, текст ошибки
+    cancelled = pyqtSignal(str)              # файл
+
+    def __init__(self, db_path, file_path, folder=None, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.file_path = file_path
+        self.folder = folder
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        db = Database(self.db_path)
+        try:
+            total = db.count_export_rows(self.folder)
+            self.progress.emit(0, total)
+            count = export_file(db, self.file_path, self.folder,
+                                on_progress=lambda done: self.progress.emit(done, total),
+                                cancel_event=self.cancel_event)
+        except Exception:
+            self.failed.emit(self.file_path, traceback.format_exc())
+            return
+        finally:
+            db.conn.close()
+
+        if self.cancel_event.is_set():
+            # Недописанный файл не оставляем
+            if os.path.exists(self.file_path):
+                os.remove(self.file_path)
+            self.cancelled.emit(self.file_path)
+        else:
+            self.finished_export.emit(self.file_path, count)
@@ -0,0 +1,75 @@
+import csv
+import os
+
+# class_counts - "класс:число животных;..." по всем классам сцены, дописан после колонок формата сабмита
+EXPORT_HEADER = ['folder_name', 'class', 'date_registration_start', 'date_registration_end', 'count', 'class_counts']
+EXPORT_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Как часто вызывать on_progress и проверять отмену, в строках
+EXPORT_PROGRESS_EVERY = 1000
+
+
+def folder_name(folder):
+    """Имя папки камеры для CSV: номер папки числом, как в формате сабмита."""
+    name = os.path.basename(os.path.normpath(folder))
+    return int(name) if name.isdigit() else name
+
+
+def format_timestamp(value):
+    # Database.iter_export_data отдаёт время строкой уже в нужном формате
+    return value if isinstance(value, str) else value.strftime(EXPORT_DATETIME_FORMAT)
+
+
+def write_rows(rows, write_row, on_progress=None, cancel_event=None):
+    """Передаёт строки экспорта по одной в write_row. Возвращает число записанных строк.
+
+    on_progress(count) вызывается каждые EXPORT_PROGRESS_EVERY строк; при установленном
+    cancel_event запись прекращается.
+    """
+    count = 0
+    for folder, class_name, start, end, animal_count, class_counts in rows:
+        write_row(folder, class_name, format_timestamp(start), format_timestamp(end), animal_count, class_counts)
+        count += 1
+        if count % EXPORT_PROGRESS_EVERY == 0:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            if on_progress:
+                on_progress(count)
+    if on_progress:
+        on_progress(count)
+    return count
+
+
+def export_csv(rows, file_path, on_progress=None, cancel_event=None):
+    """rows - строки Database.iter_export_data, читаются по одной. Возвращает число записанных строк."""
+    with open(file_path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(EXPORT_HEADER)
+        return write_rows(
+            rows,
+            lambda folder, class_name, start, end, animal_count, class_counts: writer.writerow(
+                [folder_name(folder), class_name, start, end, animal_count, class_counts]),
+            on_progress, cancel_event)
+
+
+def export_xlsx(rows, file_path, on_progress=None, cancel_event=None):
+    import openpyxl
+
+    # write_only: строки сразу уходят во временный файл, а не копятся в памяти
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(EXPORT_HEADER)
+    count = write_rows(
+        rows,
+        lambda folder, class_name, start, end, animal_count, class_counts: ws.append(
+            [folder, class_name, start, end, animal_count, class_counts]),
+        on_progress, cancel_event)
+    wb.save(file_path)
+    return count
+
+
+def export_file(db, file_path, folder=None, on_progress=None, cancel_event=None):
+    """Экспорт сцен в CSV или XLSX, формат по расширению файла."""
+    rows = db.iter_export_data(folder)
+    if file_path.lower().endswith('.xlsx'):
+        return export_xlsx(rows, file_path, on_progress, cancel_event)
+    return export_csv(rows, file_path, on_progress, cancel_event)
@@ -0,0 +1,216 @@
+"""Обработка папок с фотоловушек без графического интерфейса.
+
+    python -m foresteye ingest /data/cameras --db animal_counter.db --export result.csv
+    python -m foresteye ingest /data/cameras --report run.json --profile profiles/
+    python -m foresteye export --db animal_counter.db result.xlsx
+    python -m foresteye resegment --db animal_counter.db --gap-minutes 10
+
+Модуль не импортирует PyQt6 и folium, поэтому работает на серверах и из cron.
+"""
+import argparse
+import os
+import sys
+from datetime import timedelta
+
+from database import (Database, load_labels, load_class_thresholds, parse_class_threshold, DEFAULT_DB_PATH,
+                      DEFAULT_LABELS_PATH, DEFAULT_THRESHOLDS_PATH)
+from detector import YoloDetector, make_session_options, DEFAULT_BATCH_SIZE, DEFAULT_INPUT_SIZE
+from exporter import export_file
+from ingestion import (IngestionPipeline, ingest_folder, find_image_folders, normalize_folder,
+                       DEFAULT_DECODE_WORKERS, DEFAULT_QUEUE_SIZE)
+from instrumentation import Instrumentation, profile_path, save_report, summarize_report
+from parallel_ingestion import ParallelIngestion, DEFAULT_SHARD_SIZE
+from postprocess import class_thresholds
+from scene_segmentation import resegment_folder
+from thumbnails import ThumbnailStore, THUMBNAIL_DIR_NAME
+
+DEFAULT_MODEL_PATH = 'models/best.onnx'
+
+
+def thumbnail_root(args):
+    if not args.thumbnails:
+        return None
+    # Тот же каталог, что использует фотобанк, чтобы GUI потом открывался без пересчёта миниатюр
+    return os.path.join(os.path.dirname(os.path.abspath(args.db)), THUMBNAIL_DIR_NAME)
+
+
+def class_confidence_thresholds(args):
+    # --class-threshold перекрывает порог того же класса из файла
+    thresholds = load_class_thresholds(args.thresholds)
+    thresholds.update(args.class_thresholds or [])
+    return thresholds
+
+
+def build_pipeline(args):
+    labels = load_labels(args.labels)
+    # С --profile ONNX Runtime пишет свой трейс (chrome://tracing) рядом с профилями cProfile
+    session_options = make_session_options(profile_prefix=os.path.join(args.profile, 'onnxruntime')) \
+        if args.profile else None
+    detector = YoloDetector(args.model, labels, batch_size=args.batch_size, input_size=args.input_size,
+                            class_confidence_thresholds=class_confidence_thresholds(args),
+                            session_options=session_options)
+    root = thumbnail_root(args)
+    return IngestionPipeline(detector, decode_workers=args.decode_workers, queue_size=args.queue_size,
+                             thumbnail_store=ThumbnailStore(root) if root else None)
+
+
+def print_folder_stats(stats):
+    print(f"\r{stats['folder']}: {stats['processed']} фото, {stats['skipped']} пропущено, "
+          f"{stats['scenes']} сцен, {stats['elapsed']:.1f} с", file=sys.stderr)
+    if stats['processed']:
+        print(f"  дольше всего: {summarize_report(stats['report'])}", file=sys.stderr)
+
+
+def ingest_sequential(args, folders, db):
+    pipeline = build_pipeline(args)
+    all_stats = []
+    try:
+        for folder in folders:
+            stats = ingest_folder(folder, pipeline, db,
+                                  on_progress=lambda done, total: print_progress(folder, done, total),
+                                  metrics=Instrumentation(profile_path(args.profile, folder)))
+            print_folder_stats(stats)
+            all_stats.append(stats)
+    finally:
+        if args.profile:
+            print(f"Трейс ONNX Runtime: {pipeline.detector.end_profiling()}", file=sys.stderr)
+    return all_stats
+
+
+def ingest_parallel(args, folders, db):
+    ingestion = ParallelIngestion(args.model, load_labels(args.labels), workers=args.workers,
+                                  batch_size=args.batch_size, input_size=args.input_size,
+                                  shard_size=args.shard_size, thumbnail_root=thumbnail_root(args),
+                                  class_confidence_thresholds=class_confidence_thresholds(args))
+    # Прогресс приходит пошардово, печатаем каждый раз
+    return ingestion.ingest_folders(folders, db,
+                                    on_progress=lambda folder, done, total: print_progress(folder, done, total, 1),
+                                    on_folder=print_folder_stats, profile_dir=args.profile)
+
+
+def print_progress(folder, done, total, every=50):
+    if done == total or done % every == 0:
+        print(f"\r{folder}: {done}/{total}", end='', file=sys.stderr, flush=True)
+
+
+def ingest(args):
+    folders = []
+    for root in args.roots:
+        if not os.path.isdir(root):
+            print(f"Папка не найдена: {root}", file=sys.stderr)
+            return 2
+        folders.extend(find_image_folders(root))
+    if not folders:
+        print("Изображения не найдены", file=sys.stderr)
+        return 1
+    try:
+        # Ошибку в порогах сообщаем до загрузки модели и запуска процессов
+        class_thresholds(load_labels(args.labels), class_confidence_thresholds(args))
+    except ValueError as e:
+        print(f"Пороги по классам: {e}", file=sys.stderr)
+        return 2
+
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+    db = Database(args.db, args.labels)
+    try:
+        try:
+            if args.workers > 1:
+                all_stats = ingest_parallel(args, folders, db)
+            else:
+                all_stats = ingest_sequential(args, folders, db)
+        except KeyboardInterrupt:
+            print("\nПрервано", file=sys.stderr)
+            return 130
+
+        if args.report:
+            save_report(all_stats, args.report)
+            print(f"Отчёт: {args.report}", file=sys.stderr)
+
+        if args.export:
+            rows = export_file(db, args.export)
+            print(f"Экспортировано строк: {rows} -> {args.export}", file=sys.stderr)
+    finally:
+        db.conn.close()
+    return 0
+
+
+def export(args):
+    db = Database(args.db, args.labels)
+    try:
+        rows = export_file(db, args.output, normalize_folder(args.folder) if args.folder else None)
+    finally:
+        db.conn.close()
+    print(f"Экспортировано строк: {rows} -> {args.output}", file=sys.stderr)
+    return 0
+
+
+def resegment(args):
+    db = Database(args.db, args.labels)
+    try:
+        scene_gap = timedelta(minutes=args.gap_minutes) if args.gap_minutes is not None else None
+        for folder in [normalize_folder(folder) for folder in args.folders] or db.get_unique_folders():
+            scenes, rebuilt = resegment_folder(db, folder, scene_gap)
+            print(f"{folder}: {scenes} сцен, пересобрано {rebuilt}", file=sys.stderr)
+    finally:
+        db.conn.close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='foresteye', description="Детекция животных на фото с фотоловушек")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="файл базы SQLite")
+    parser.add_argument('--labels', default=DEFAULT_LABELS_PATH, help="файл с именами классов")
+    # Те же опции после команды; SUPPRESS - чтобы не затирать значения, заданные до команды
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--db', default=argparse.SUPPRESS, help="файл базы SQLite")
+    common.add_argument('--labels', default=argparse.SUPPRESS, help="файл с именами классов")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = commands.add_parser('ingest', parents=[common],
+                                        help="обработать папки с фото и сохранить результаты в базу")
+    ingest_parser.add_argument('roots', nargs='+', help="папки с фото; подпапки с изображениями обрабатываются как отдельные камеры")
+    ingest_parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    ingest_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    ingest_parser.add_argument('--input-size', type=int, default=DEFAULT_INPUT_SIZE)
+    ingest_parser.add_argument('--thresholds', metavar='FILE', default=DEFAULT_THRESHOLDS_PATH,
+                               help="файл порогов уверенности по классам, строки КЛАСС=ПОРОГ")
+    ingest_parser.add_argument('--class-threshold', dest='class_thresholds', metavar='КЛАСС=ПОРОГ',
+                               type=parse_class_threshold, action='append',
+                               help="порог уверенности для класса, можно повторять; перекрывает файл порогов")
+    ingest_parser.add_argument('--decode-workers', type=int, default=DEFAULT_DECODE_WORKERS)
+    ingest_parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE)
+    ingest_parser.add_argument('--workers', type=int, default=1,
+                               help="число процессов; больше 1 - папки и их части обрабатываются параллельно")
+    ingest_parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                               help="сколько фото одной папки отдаётся процессу за раз (при --workers > 1)")
+    ingest_parser.add_argument('--no-thumbnails', dest='thumbnails', action='store_false',
+                               help="не сохранять миниатюры для фотобанка")
+    ingest_parser.add_argument('--export', metavar='FILE', help="после обработки выгрузить сцены в CSV/XLSX")
+    ingest_parser.add_argument('--report', metavar='FILE',
+                               help="сохранить JSON-отчёт: статистика и замеры стадий по каждой папке")
+    ingest_parser.add_argument('--profile', metavar='DIR',
+                               help="сохранить в DIR профили cProfile по папкам и трейс ONNX Runtime "
+                                    "(при --workers > 1 - только cProfile родительского процесса)")
+    ingest_parser.set_defaults(func=ingest)
+
+    export_parser = commands.add_parser('export', parents=[common], help="выгрузить сцены из базы в CSV/XLSX")
+    export_parser.add_argument('output', help="файл .csv или .xlsx")
+    export_parser.add_argument('--folder', help="только одна папка")
+    export_parser.set_defaults(func=export)
+    resegment_parser = commands.add_parser('resegment', parents=[common],
+                                           help="пересобрать сцены по новому промежутку без повторной детекции")
+    resegment_parser.add_argument('folders', nargs='*', help="папки как в базе; по умолчанию все")
+    resegment_parser.add_argument('--gap-minutes', type=float,
+                                  help="промежуток между сценами; запоминается для папки и используется при следующих загрузках")
+    resegment_parser.set_defaults(func=resegment)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import queue
+import threading
+import traceback
+from PyQt6.QtCore import QThread, pyqtSignal
+from database import Database
+
+
+class IngestionWorker(QThread):
+    """Фоновая загрузка папок. Папки обрабатываются по очереди в отдельном потоке
+    со своим подключением к базе, GUI получает только сигналы."""
+
+    folder_started = pyqtSignal(str, int)        # папка, сколько папок ещё в очереди
+    progress = pyqtSignal(str, int, int)         # папка, обработано, всего
+    image_processed = pyqtSignal(str, dict)      # папка, данные фото
+    folder_finished = pyqtSignal(str, dict)      # папка, статистика
+    folder_failed = pyqtSignal(str, str)         # папка, текст ошибки
+    queue_empty = pyqtSignal()
+    model_loading = pyqtSignal()
+
+    def __init__(self, create_pipeline, db_path, parent=None):
+        super().__init__(parent)
+        self.create_pipeline = create_pipeline
+        self.pipeline = None
+        self.pipeline_lock = threading.Lock()
+        self.db_path = db_path
+        self.folders = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.current_folder = None
+
+    def get_pipeline(self):
+        """Конвейер с моделью создаётся при первой обработке, а не при запуске приложения:
+        загрузка InferenceSession занимает секунды."""
+        with self.pipeline_lock:
+            if self.pipeline is None:
+                self.model_loading.emit()
+                self.pipeline = self.create_pipeline()
+            return self.pipeline
+
+    def enqueue(self, folder):
+        self.folders.put(folder)
+        if not self.isRunning():
+            self.start()
+
+    def pending_count(self):
+        return self.folders.qsize()
+
+    def cancel_current(self):
+        self.cancel_event.set()
+
+    def cancel_all(self):
+        while True:
+            try:
+                self.folders.get_nowait()
+            except queue.Empty:
+                break
+        self.cancel_event.set()
+
+    def stop(self):
+        if not self.isRunning():
+            return
+        self.cancel_all()
+        self.folders.put(None)
+        self.wait()
+
+    def run(self):
+        # numpy, OpenCV и onnxruntime импортируются здесь, в фоновом потоке, а не при старте GUI
+        from ingestion import ingest_folder
+
+        db = Database(self.db_path)
+        while True:
+            folder = self.folders.get()
+            if folder is None:
+                break
+
+            self.current_folder = folder
+            self.cancel_event.clear()
+            self.folder_started.emit(folder, self.folders.qsize())
+            try:
+                stats = ingest_folder(
+                    folder, self.get_pipeline(), db,
+                    cancel_event=self.cancel_event,
+                    on_progress=lambda done, total, f=folder: self.progress.emit(f, done, total),
+                    on_photo=lambda photo, f=folder: self.image_processed.emit(f, self._photo_payload(photo))
+                )
+                self.folder_finished.emit(folder, stats)
+            except Exception:
+                self.folder_failed.emit(folder, traceback.format_exc())
+            finally:
+                self.current_folder = None
+            if self.folders.empty():
+                self.queue_empty.emit()
+
+    def _photo_payload(self, photo):
+        return {
+            'path': photo['path'],
+            'timestamp': photo['timestamp'].strftime("%Y-%m-%d %H:%M:%S"),
+            'animal_count': photo['animal_count'],
+            'unique_animal_count': photo['unique_animal_count'],
+        }
@@ -0,0 +1,482 @@
+import hashlib
+import heapq
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from exif_timestamp import read_exif_timestamp
+from instrumentation import Instrumentation
+from postprocess import Detections, empty_detections
+from preprocessing import CanvasPool
+from scene_segmentation import SCENE_GAP, segment_scenes
+from tracker import Tracker
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+CLASS_SMOOTHING_WINDOW = timedelta(seconds=30)
+
+DEFAULT_DECODE_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+DEFAULT_QUEUE_SIZE = 32
+CONTENT_HASH_CHUNK = 64 * 1024
+
+_SENTINEL = object()
+
+# paths - новые и изменённые файлы папки в порядке времени съёмки, им нужна детекция;
+# timestamps - {путь: время съёмки}; fingerprints - {путь: (size, mtime_ns, content_hash)} для paths;
+# replay - уже обработанные фото (path, timestamp, detections), сцены которых надо пересобрать;
+# scene_labels - {путь: номер сцены} для paths и replay; skipped - сколько файлов пропущено как уже обработанные
+FolderPlan = namedtuple('FolderPlan', ['folder', 'paths', 'timestamps', 'fingerprints', 'replay', 'scene_labels',
+                                       'skipped'])
+
+
+def normalize_folder(folder):
+    """Ключ папки в базе: абсолютный путь, как бы папку ни указали (относительно, с '..' или '/' в конце)."""
+    return os.path.abspath(folder)
+
+
+def list_image_files(folder):
+    return [f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def find_image_folders(root):
+    """Папки внутри root (включая сам root), в которых есть изображения - по одной на камеру."""
+    folders = []
+    for dirpath, dirnames, filenames in os.walk(normalize_folder(root)):
+        dirnames.sort()
+        if any(f.lower().endswith(IMAGE_EXTENSIONS) for f in filenames):
+            folders.append(dirpath)
+    return folders
+
+
+def get_photo_timestamp(file_path):
+    try:
+        timestamp = read_exif_timestamp(file_path)
+        if timestamp is not None:
+            return timestamp
+    except Exception as e:
+        print(f"Ошибка при чтении EXIF данных: {e}")
+
+    return datetime.fromtimestamp(os.path.getmtime(file_path)).replace(microsecond=0)
+
+
+def get_photo_timestamps(file_paths, db=None, metrics=None):
+    """Время съёмки для списка файлов одним проходом.
+
+    Если передана база, результаты кэшируются по (path, size, mtime), и
+    при повторном сканировании EXIF читается только у новых или изменённых файлов.
+    """
+    metrics = metrics or Instrumentation()
+    cached = {}
+    if db is not None:
+        for folder in {os.path.dirname(path) for path in file_paths}:
+            cached.update(db.get_cached_timestamps(folder))
+
+    timestamps = {}
+    misses = []
+    for path in file_paths:
+        stat = os.stat(path)
+        entry = cached.get(path)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            timestamps[path] = entry[2]
+            metrics.count('timestamp_cache_hits')
+            continue
+        with metrics.stage('exif'):
+            timestamp = get_photo_timestamp(path)
+        timestamps[path] = timestamp
+        misses.append((path, stat.st_size, stat.st_mtime_ns, timestamp))
+
+    if db is not None and misses:
+        db.save_cached_timestamps(misses)
+    return timestamps
+
+
+def content_hash(path, size=None):
+    """sha1 от размера, начала и конца файла: читать фото целиком ради отпечатка не нужно."""
+    size = os.path.getsize(path) if size is None else size
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(CONTENT_HASH_CHUNK))
+        if size > CONTENT_HASH_CHUNK:
+            f.seek(max(CONTENT_HASH_CHUNK, size - CONTENT_HASH_CHUNK))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def plan_folder(folder, db=None, scene_gap=None, metrics=None):
+    """Что нужно сделать при (повторной) загрузке папки, см. FolderPlan.
+
+    Фото, которые уже есть в базе с тем же размером и mtime или тем же
+    содержимым, пропускаются. Если новые фото попадают в уже сохранённую
+    сцену или раньше неё, эти сцены пересобираются из детекций в базе.
+    Границы сцен считаются здесь же, до детекции; scene_gap по умолчанию -
+    настройка папки в базе или SCENE_GAP.
+    """
+    metrics = metrics or Instrumentation()
+    with metrics.stage('plan'):
+        return _plan_folder(folder, db, scene_gap, metrics)
+
+
+def _plan_folder(folder, db, scene_gap, metrics):
+    folder = normalize_folder(folder)
+    if scene_gap is None:
+        scene_gap = (db.get_scene_gap(folder) if db is not None else None) or SCENE_GAP
+    file_paths = [os.path.join(folder, f) for f in list_image_files(folder)]
+    timestamps = get_photo_timestamps(file_paths, db, metrics)
+    known = db.get_photo_fingerprints(folder) if db is not None else {}
+
+    paths = []
+    fingerprints = {}
+    unchanged = []
+    for path in file_paths:
+        stat = os.stat(path)
+        entry = known.get(path)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            continue
+        with metrics.stage('content_hash'):
+            digest = content_hash(path, stat.st_size)
+        # Фото из базы до появления отпечатков (entry без хэша) считаем обработанными
+        if entry is not None and (entry[2] is None or (entry[0] == stat.st_size and entry[2] == digest)):
+            unchanged.append((path, stat.st_size, stat.st_mtime_ns, digest))
+            continue
+        paths.append(path)
+        fingerprints[path] = (stat.st_size, stat.st_mtime_ns, digest)
+    if unchanged:
+        db.update_photo_fingerprints(unchanged)
+    paths.sort(key=timestamps.get)
+
+    replay = []
+    if paths and db is not None:
+        since = timestamps[paths[0]]
+        previous = db.get_previous_photo(folder, since)
+        if previous is not None and since - previous[0] <= scene_gap:
+            # Новые фото продолжают сохранённую сцену - открываем её заново
+            since = db.get_scene_start(previous[1]) or since
+        replay = [photo for photo in db.get_folder_detections(folder, since) if photo[0] not in fingerprints]
+        timestamps.update((path, timestamp) for path, timestamp, _ in replay)
+
+    # Тот же порядок, в котором build_scenes сливает уже обработанные и новые фото
+    order = list(heapq.merge([photo[0] for photo in replay], paths, key=timestamps.get))
+    scene_labels = dict(zip(order, segment_scenes([timestamps[path] for path in order], scene_gap).tolist()))
+
+    return FolderPlan(folder, paths, timestamps, fingerprints, replay, scene_labels, len(file_paths) - len(paths))
+
+
+def ingest_folder(folder, pipeline, db, cancel_event=None, on_progress=None, on_photo=None, metrics=None):
+    """Обрабатывает папку: детекция новых и изменённых фото в порядке времени съёмки,
+    группировка по сценам и сохранение в базу.
+
+    on_progress(done, total) вызывается после каждого фото, on_photo(photo) -
+    с данными обработанного фото. Каждая сцена сохраняется, как только закрывается,
+    поэтому прерванная загрузка при повторном запуске продолжается с места остановки.
+    metrics - Instrumentation для замеров стадий; отчёт попадает в stats['report'].
+    """
+    start_time = time.time()
+    metrics = metrics or Instrumentation()
+    metrics.profile_thread()
+    plan = plan_folder(folder, db, metrics=metrics)
+
+    # Декодирование, инференс и постобработка идут параллельно;
+    # результаты приходят в порядке plan.paths, то есть по времени съёмки
+    with closing(pipeline.run(plan.paths, cancel_event, metrics)) as results_stream:
+        return build_scenes(plan, results_stream, db, cancel_event, on_progress, on_photo, start_time, metrics)
+
+
+def replay_stream(replay):
+    for path, _, detections in replay:
+        if detections:
+            boxes, class_ids, scores = [], [], []
+            for x1, y1, x2, y2, class_id, confidence in detections:
+                boxes.append((x1, y1, x2, y2))
+                class_ids.append(class_id)
+                scores.append(confidence or 0.0)
+            yield path, Detections(np.array(boxes, np.float32), np.array(scores, np.float32),
+                                   np.array(class_ids, np.int32)), False
+        else:
+            yield path, empty_detections(), False
+
+
+def build_scenes(plan, results_stream, db, cancel_event=None, on_progress=None, on_photo=None, start_time=None,
+                 metrics=None):
+    """Группирует результаты детекции одной папки по сценам и сохраняет в базу.
+
+    results_stream - пары (path, Detections) для plan.paths в порядке времени съёмки;
+    с ними по времени сливаются уже обработанные фото из plan.replay. Каждая
+    сцена записывается отдельной транзакцией, как только закрывается.
+    Возвращает статистику по папке и записывает её в import_runs.
+    """
+    start_time = start_time or time.time()
+    metrics = metrics or Instrumentation()
+    total = len(plan.paths)
+    scene_count = 0
+
+    def save_scene(scene):
+        nonlocal scene_count
+        with metrics.stage('db_write'):
+            save_scenes(db, [scene])
+        scene_count += 1
+
+    scene_builder = SceneBuilder(on_scene=save_scene, metrics=metrics)
+    processed_images = 0
+
+    new_stream = ((path, results, True) for path, results in results_stream)
+    for file_path, results, is_new in heapq.merge(replay_stream(plan.replay), new_stream,
+                                                   key=lambda item: plan.timestamps[item[0]]):
+        photo = scene_builder.add_photo(file_path, plan.timestamps[file_path], results, plan.scene_labels[file_path])
+        if not is_new:
+            metrics.count('replayed')
+            continue
+        photo['fingerprint'] = plan.fingerprints[file_path]
+        processed_images += 1
+        metrics.count('photos')
+        metrics.count('detections', photo['animal_count'])
+        if on_photo:
+            on_photo(photo)
+        if on_progress:
+            on_progress(processed_images, total)
+
+    scene_builder.finish()
+    metrics.count('scenes', scene_count)
+    metrics.count('skipped', plan.skipped)
+    if metrics.profile_path:
+        metrics.dump_profile()
+
+    stats = {
+        'folder': plan.folder,
+        'total': total + plan.skipped,
+        'processed': processed_images,
+        'skipped': plan.skipped,
+        'scenes': scene_count,
+        'cancelled': cancel_event is not None and cancel_event.is_set(),
+        'elapsed': time.time() - start_time,
+        'report': metrics.report(),
+    }
+    db.add_import_run(stats)
+    return stats
+
+
+def save_scenes(db, scenes):
+    db.add_scenes([(scene['max_unique_animals'], scene['photos']) for scene in scenes])
+
+
+class IngestionPipeline:
+    """Конвейер загрузки: декодирование и letterbox в пуле потоков,
+    инференс в отдельном потоке, постобработка у вызывающего в исходном порядке.
+
+    Изображения готовятся в переиспользуемые буферы CanvasPool: новые буферы
+    под каждое фото не выделяются, а размер пула ограничивает число
+    подготовленных изображений в памяти.
+    """
+
+    def __init__(self, detector, decode_workers=DEFAULT_DECODE_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 thumbnail_store=None):
+        self.detector = detector
+        self.thumbnail_store = thumbnail_store
+        self.decode_workers = max(1, decode_workers)
+        self.queue_size = max(queue_size, detector.batch_size)
+        # Одна пачка в инференсе, одна набирается, плюс по буферу на поток декодирования
+        self.canvas_count = 2 * detector.batch_size + self.decode_workers
+
+    def run(self, paths, cancel_event=None, metrics=None):
+        """Генератор пар (path, results) в порядке paths.
+
+        Нечитаемые файлы пропускаются. Прерывание генератора (break/close)
+        или установка cancel_event останавливает все стадии.
+        """
+        metrics = metrics or Instrumentation()
+        stop = threading.Event()
+        canvases = CanvasPool(self.canvas_count, self.detector.input_size)
+        decoded = queue.Queue(maxsize=self.queue_size)
+        inferred = queue.Queue(maxsize=self.queue_size)
+        executor = ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix='decode',
+                                      initializer=metrics.profile_thread)
+
+        producer = threading.Thread(target=self._produce, args=(paths, executor, canvases, decoded, stop, metrics),
+                                    daemon=True)
+        inference = threading.Thread(target=self._infer, args=(canvases, decoded, inferred, stop, metrics),
+                                     daemon=True)
+        producer.start()
+        inference.start()
+
+        try:
+            while True:
+                item = self._get(inferred, stop)
+                if item is _SENTINEL or (cancel_event is not None and cancel_event.is_set()):
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            producer.join()
+            inference.join()
+            executor.shutdown(wait=True)
+
+    def _decode(self, path, canvas, metrics):
+        # Крупные JPEG декодируются сразу уменьшенными, боксы потом переводятся в исходный размер
+        with metrics.stage('decode'):
+            image, source_size = self.detector.read_image(path)
+        if image is None:
+            print(f"Не удалось прочитать изображение: {path}")
+            metrics.count('unreadable')
+            return path, canvas, None
+        if self.thumbnail_store is not None:
+            # Изображение уже декодировано, миниатюра для фотобанка почти бесплатна
+            with metrics.stage('thumbnail'):
+                self.thumbnail_store.save(path, image)
+        with metrics.stage('letterbox'):
+            _, info = self.detector.preprocess(image, canvas, source_size)
+        return path, canvas, info
+
+    def _produce(self, paths, executor, canvases, decoded, stop, metrics):
+        for path in paths:
+            # Буфер берётся здесь, в порядке paths: тогда инференс, который забирает
+            # задачи по порядку, всегда может собрать пачку и вернуть буферы в пул
+            canvas = canvases.acquire(stop)
+            if canvas is None:
+                return
+            if not self._put(decoded, executor.submit(self._decode, path, canvas, metrics), stop):
+                return
+        self._put(decoded, _SENTINEL, stop)
+
+    def _infer(self, canvases, decoded, inferred, stop, metrics):
+        metrics.profile_thread()
+        try:
+            finished = False
+            while not finished and not stop.is_set():
+                batch = []
+                while len(batch) < self.detector.batch_size:
+                    future = self._get(decoded, stop)
+                    if future is _SENTINEL:
+                        finished = True
+                        break
+                    # Сколько инференс ждёт декодирования: если много - узкое место в декодировании
+                    with metrics.stage('decode_wait'):
+                        path, canvas, info = future.result()
+                    if info is None:
+                        canvases.release(canvas)
+                    else:
+                        batch.append((path, canvas, info))
+                if not batch:
+                    continue
+                # detect_batch копирует буферы во входной тензор, после него их можно отдавать декодированию
+                results = self.detector.detect_batch([b[1] for b in batch], [b[2] for b in batch], metrics)
+                for _, canvas, _ in batch:
+                    canvases.release(canvas)
+                for (path, _, _), detections in zip(batch, results):
+                    if not self._put(inferred, (path, detections), stop):
+                        return
+            self._put(inferred, _SENTINEL, stop)
+        except Exception as e:
+            self._put(inferred, e, stop)
+        finally:
+            metrics.stop_thread_profile()
+
+    @staticmethod
+    def _put(q, item, stop):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _get(q, stop):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    return _SENTINEL
+
+
+class SceneBuilder:
+    """Группирует обработанные фото в сцены и присваивает животным id внутри сцены.
+
+    Фото должны подаваться в порядке возрастания времени съёмки.
+    """
+
+    def __init__(self, scene_gap=SCENE_GAP, on_scene=None, metrics=None):
+        """on_scene(scene) вызывается для каждой закрытой сцены; без него сцены копятся в scenes.
+
+        metrics - Instrumentation, в стадию 'tracker' попадает только сопоставление трекером,
+        сохранение закрытых сцен в on_scene замеряется отдельно.
+        """
+        self.scene_gap = scene_gap
+        self.on_scene = on_scene
+        self.metrics = metrics or Instrumentation()
+        self.scenes = []
+        self.current_scene = None
+        self.last_photo_time = None
+        self.last_class = None  # Последний класс детекции
+        self.last_detection_time = None  # Время последней детекции
+
+    def add_photo(self, file_path, timestamp, results, scene_label=None):
+        """scene_label - номер сцены из segment_scenes; без него граница сцены определяется по scene_gap."""
+        if scene_label is not None:
+            new_scene = self.current_scene is None or scene_label != self.current_scene['label']
+        else:
+            new_scene = self.current_scene is None or self.is_new_scene(timestamp, self.last_photo_time)
+        if new_scene:
+            self.close_scene()
+            self.current_scene = {
+                'label': scene_label,
+                'photos': [],
+                'tracker': Tracker(),
+                'max_unique_animals': 0,
+            }
+
+        boxes = results.boxes.astype(np.int32)
+        with self.metrics.stage('tracker'):
+            animal_ids = self.current_scene['tracker'].update(boxes, timestamp).tolist()
+        detections = []
+        for box, confidence, class_id, animal_id in zip(boxes.tolist(), results.scores.tolist(),
+                                                        results.class_ids.tolist(), animal_ids):
+            x1, y1, x2, y2 = box
+
+            # Фильтрация выбросов
+            if self.last_class is not None and (timestamp - self.last_detection_time) < CLASS_SMOOTHING_WINDOW:
+                class_id = self.last_class
+
+            detections.append((x1, y1, x2, y2, class_id, confidence, animal_id))
+
+            self.last_class = class_id
+            self.last_detection_time = timestamp
+
+        unique_animal_count = len(set(animal_ids))
+        self.current_scene['max_unique_animals'] = max(self.current_scene['max_unique_animals'], unique_animal_count)
+        photo = {
+            'path': file_path,
+            'timestamp': timestamp,
+            'animal_count': len(detections),
+            'unique_animal_count': unique_animal_count,
+            'detections': detections
+        }
+        self.current_scene['photos'].append(photo)
+        self.last_photo_time = timestamp
+        return photo
+
+    def close_scene(self):
+        if self.current_scene is None:
+            return
+        if self.on_scene:
+            self.on_scene(self.current_scene)
+        else:
+            self.scenes.append(self.current_scene)
+        self.current_scene = None
+
+    def finish(self):
+        self.close_scene()
+        return self.scenes
+
+    def is_new_scene(self, current_time, last_photo_time):
+        if last_photo_time is None:
+            return True
+        return current_time - last_photo_time > self.scene_gap
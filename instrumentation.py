@@ -0,0 +1,140 @@
+import cProfile
+import hashlib
+import json
+import os
+import pstats
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+# Не стадии, а ожидание или сумма других стадий - в кратком итоге не сравниваются с остальными
+SUMMARY_EXCLUDED = ('plan', 'decode_wait')
+
+
+class Instrumentation:
+    """Замеры стадий загрузки: время каждого вызова по стадиям и счётчики.
+
+    Потокобезопасна: стадии конвейера пишут в один объект из разных потоков.
+    С profile_path дополнительно собирается cProfile по всем потокам, которые
+    вызвали profile_thread(); dump_profile() пишет его в profile_path.
+    """
+
+    def __init__(self, profile_path=None):
+        self.samples = defaultdict(list)
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.profile_path = profile_path
+        self.profilers = []
+        self.local = threading.local()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.samples[name].append(seconds)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def merge(self, samples, counters):
+        """Добавляет замеры другого процесса (см. ParallelIngestion)."""
+        with self.lock:
+            for name, values in samples.items():
+                self.samples[name].extend(values)
+            self.counters.update(counters)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: list(values) for name, values in self.samples.items()}, dict(self.counters)
+
+    def profile_thread(self):
+        """Включает cProfile в текущем потоке, если профилирование запрошено."""
+        if not self.profile_path or getattr(self.local, 'profiler', None) is not None:
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: одновременно может работать только один профилировщик,
+            # остальные потоки остаются без профиля
+            profiler = False
+        self.local.profiler = profiler
+        if profiler:
+            with self.lock:
+                self.profilers.append(profiler)
+
+    def stop_thread_profile(self):
+        profiler = getattr(self.local, 'profiler', None)
+        if profiler:
+            profiler.disable()
+
+    def dump_profile(self):
+        """Сохраняет объединённый профиль (формат pstats) в profile_path и возвращает путь или None."""
+        self.stop_thread_profile()
+        if not self.profilers:
+            return None
+        stats = pstats.Stats(self.profilers[0])
+        for profiler in self.profilers[1:]:
+            stats.add(profiler)
+        stats.dump_stats(self.profile_path)
+        return self.profile_path
+
+    def report(self):
+        """Отчёт для JSON: по каждой стадии число вызовов, суммарное время, p50/p95/max."""
+        samples, counters = self.snapshot()
+        stages = {}
+        for name, values in samples.items():
+            values = np.asarray(values, dtype=np.float64)
+            stages[name] = {
+                'count': int(len(values)),
+                'total_s': float(values.sum()),
+                'p50_ms': float(np.percentile(values, 50) * 1000),
+                'p95_ms': float(np.percentile(values, 95) * 1000),
+                'max_ms': float(values.max() * 1000),
+            }
+        return {
+            'wall_s': time.perf_counter() - self.started,
+            'stages': stages,
+            'counters': counters,
+            'profile': self.profile_path if self.profilers else None,
+        }
+
+
+def profile_path(profile_dir, folder):
+    """Файл профиля папки в profile_dir; None, если профилирование выключено.
+
+    К имени папки добавляется хэш полного пути: у cam1/1 и cam2/1 профили разные.
+    """
+    if not profile_dir:
+        return None
+    folder = os.path.normpath(os.path.abspath(folder))
+    name = os.path.basename(folder) or 'root'
+    digest = hashlib.sha1(folder.encode('utf-8', 'surrogateescape')).hexdigest()[:8]
+    return os.path.join(profile_dir, f"{name}_{digest}_{time.strftime('%Y%m%d_%H%M%S')}.prof")
+
+
+def summarize_report(report, top=3):
+    """Короткая строка для диалога: стадии, на которые ушло больше всего времени."""
+    stages = sorted(((name, stage) for name, stage in report['stages'].items() if name not in SUMMARY_EXCLUDED),
+                    key=lambda item: item[1]['total_s'], reverse=True)[:top]
+    summary = ", ".join(f"{name} {stage['total_s']:.1f} с (p95 {stage['p95_ms']:.0f} мс)" for name, stage in stages)
+    wait = report['stages'].get('decode_wait')
+    if wait is not None:
+        summary += f"; инференс ждал декодирования {wait['total_s']:.1f} с"
+    return summary
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
@@ -1,13 +1,16 @@
 import sys
+import time
+
+# Отсчёт времени запуска - до тяжёлых импортов
+STARTUP_TIME = time.perf_counter()
+
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
                              QTableWidget, QTableWidgetItem, QFileDialog, QCheckBox, QProgressDialog,
                              QLabel, QMainWindow, QStackedWidget)
 from PyQt6.QtGui import QScreen
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QCoreApplication, QTimer
 from database import Database
 from photo_bank import PhotoBankPage
-from photo_processing import PhotoProcessingPage
-from map_page import MapPage
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -28,23 +31,11 @@ class MainWindow(QMainWindow):
         self.stacked_widget = QStackedWidget()
         self.setCentralWidget(self.stacked_widget)
 
-        # Создание страниц
+        # Фотобанк нужен сразу, остальные страницы создаются при первом переходе на них
         self.photo_bank_page = PhotoBankPage(self.db, self.show_processing_page)
-        self.photo_processing_page = PhotoProcessingPage(self.db, self.show_photo_bank_page)
-        self.map_page = MapPage(self.db)
-
-        # Добавление страниц в стек
-        self.stacked_widget.addWidget(self.photo_bank_page)
-        self.stacked_widget.addWidget(self.photo_processing_page)
-        self.stacked_widget.addWidget(self.map_page)
-
-        # Подключение сигналов кнопок навигации
-        self.photo_bank_page.nav_menu.photo_bank_button.clicked.connect(self.show_photo_bank_page)
-        self.photo_bank_page.nav_menu.map_button.clicked.connect(self.show_map_page)
-        self.photo_processing_page.nav_menu.photo_bank_button.clicked.connect(self.show_photo_bank_page)
-        self.photo_processing_page.nav_menu.map_button.clicked.connect(self.show_map_page)
-        self.map_page.nav_menu.photo_bank_button.clicked.connect(self.show_photo_bank_page)
-        self.map_page.nav_menu.map_button.clicked.connect(self.show_map_page)
+        self.photo_processing_page = None
+        self.map_page = None
+        self.add_page(self.photo_bank_page)
 
         # Установка начальной страницы
         self.show_photo_bank_page()
@@ -52,16 +43,36 @@ class MainWindow(QMainWindow):
         # Применение стилей
         self.apply_styles()
 
+    def add_page(self, page):
+        self.stacked_widget.addWidget(page)
+        page.nav_menu.photo_bank_button.clicked.connect(self.show_photo_bank_page)
+        page.nav_menu.map_button.clicked.connect(self.show_map_page)
+
     def show_photo_bank_page(self):
         self.stacked_widget.setCurrentWidget(self.photo_bank_page)
 
     def show_processing_page(self, photo_id):
+        if self.photo_processing_page is None:
+            from photo_processing import PhotoProcessingPage
+            self.photo_processing_page = PhotoProcessingPage(self.db, self.show_photo_bank_page)
+            self.add_page(self.photo_processing_page)
         self.photo_processing_page.load_photo(photo_id)
         self.stacked_widget.setCurrentWidget(self.photo_processing_page)
 
     def show_map_page(self):
+        if self.map_page is None:
+            # QtWebEngine и folium импортируются только при первом открытии карты
+            from map_page import MapPage
+            self.map_page = MapPage(self.db)
+            self.add_page(self.map_page)
+            self.photo_bank_page.ingestion_worker.folder_finished.connect(self.map_page.on_folder_ingested)
         self.stacked_widget.setCurrentWidget(self.map_page)
 
+    def closeEvent(self, event):
+        # Дожидаемся остановки фоновой обработки, чтобы не оборвать запись в базу
+        self.photo_bank_page.shutdown()
+        super().closeEvent(event)
+
     def apply_styles(self):
         self.setStyleSheet("""
             QMainWindow {
@@ -94,8 +105,17 @@ class MainWindow(QMainWindow):
             }
         """)
 
+def report_startup_time():
+    print(f"Время до первого окна: {time.perf_counter() - STARTUP_TIME:.2f} с", file=sys.stderr)
+
+
 if __name__ == '__main__':
+    # QtWebEngine импортируется позже, чем создаётся QApplication; для этого
+    # общий OpenGL-контекст нужно включить заранее
+    QCoreApplication.setAttribute(Qt.ApplicationAttribute.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    # Срабатывает после первой отрисовки окна
+    QTimer.singleShot(0, report_startup_time)
     sys.exit(app.exec())
\ No newline at end of file
@@ -1,11 +1,12 @@
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QSizePolicy, QComboBox, QLabel
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QSizePolicy, QComboBox, QLabel, QCheckBox
 from PyQt6.QtCore import QDateTime
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 import folium
 from folium.plugins import MarkerCluster
 import io
 from navigation_menu import NavigationMenu
-from datetime import datetime, date
+from time_index import FolderTimeIndex
+from datetime import datetime
 
 folder_coordinates = {
     "1": [55.7558, 37.6173],  # Москва (центр)
@@ -64,6 +65,7 @@ class MapPage(QWidget):
     def __init__(self, db, parent=None):
         super().__init__(parent)
         self.db = db
+        self.time_index = FolderTimeIndex(db)
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(20, 20, 20, 20)
         self.layout.setSpacing(15)
@@ -89,6 +91,11 @@ class MapPage(QWidget):
         """)
         self.folder_combo.currentTextChanged.connect(self.update_date_time_options)
         self.folder_layout.addWidget(self.folder_combo)
+        # Снимок: все камеры на выбранный момент
+        self.snapshot_checkbox = QCheckBox("Все камеры")
+        self.snapshot_checkbox.setStyleSheet("font-size: 16px;")
+        self.snapshot_checkbox.toggled.connect(self.on_snapshot_toggled)
+        self.folder_layout.addWidget(self.snapshot_checkbox)
         self.folder_layout.addStretch(1)
         self.controls_layout.addLayout(self.folder_layout)
 
@@ -131,6 +138,7 @@ class MapPage(QWidget):
             }
         """)
         self.update_button.clicked.connect(self.update_map)
+        self.date_combo.currentTextChanged.connect(self.update_time_options)
         self.date_time_layout.addWidget(self.date_label)
         self.date_time_layout.addWidget(self.date_combo)
         self.date_time_layout.addWidget(self.time_label)
@@ -161,53 +169,59 @@ class MapPage(QWidget):
         folders = self.db.get_unique_folders()
         self.folder_combo.addItems(folders)
 
+    def selected_folder(self):
+        """Выбранная папка или None в режиме всех камер."""
+        if self.snapshot_checkbox.isChecked():
+            return None
+        return self.folder_combo.currentText()
+
+    def on_snapshot_toggled(self, checked):
+        self.folder_combo.setEnabled(not checked)
+        self.update_date_time_options()
+
     def update_date_time_options(self):
-        selected_folder = self.folder_combo.currentText()
-        timestamps = self.db.get_timestamps_for_folder(selected_folder)
-        
+        selected_folder = self.selected_folder()
+        dates = self.time_index.get_dates(selected_folder)
+
+        # Сигнал даты заблокирован на время заполнения, времена загружаются один раз ниже
+        self.date_combo.blockSignals(True)
         self.date_combo.clear()
-        self.time_combo.clear()
-        
-        if timestamps:
-            unique_dates = sorted(set(ts.date() for ts in timestamps))
-            self.date_combo.addItems([date.strftime('%Y-%m-%d') for date in unique_dates])
-            
-            if unique_dates:
-                self.update_time_options(unique_dates[0])
-            
-            self.date_combo.currentTextChanged.connect(self.update_time_options)
+        self.date_combo.addItems(dates)
+        self.date_combo.blockSignals(False)
+
+        if dates:
+            self.update_time_options(self.date_combo.currentText())
         else:
+            self.time_combo.clear()
             print(f"No timestamps found for folder: {selected_folder}")
 
     def update_time_options(self, selected_date):
+        self.time_combo.clear()
         if not selected_date:
-            print("No date selected")
             return
+        self.time_combo.addItems(self.time_index.get_times(self.selected_folder(), selected_date))
 
-        selected_folder = self.folder_combo.currentText()
-        timestamps = self.db.get_timestamps_for_folder(selected_folder)
-        
-        if isinstance(selected_date, str):
-            try:
-                selected_date = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            except ValueError:
-                print(f"Invalid date format: {selected_date}")
-                return
-        elif not isinstance(selected_date, date):
-            print(f"Unexpected date type: {type(selected_date)}")
-            return
-
-        times_for_date = [ts.time() for ts in timestamps if ts.date() == selected_date]
-        
-        self.time_combo.clear()
-        self.time_combo.addItems([time.strftime('%H:%M:%S') for time in sorted(times_for_date)])
+    def on_folder_ingested(self, folder, stats):
+        """После загрузки папки сбрасывает её кэш времён и обновляет списки, если папка выбрана."""
+        self.time_index.invalidate(folder)
+        if self.folder_combo.findText(folder) < 0:
+            self.folder_combo.addItem(folder)
+        if self.selected_folder() in (folder, None):
+            selected_date = self.date_combo.currentText()
+            selected_time = self.time_combo.currentText()
+            self.update_date_time_options()
+            # Выбор пользователя сохраняется, если такие дата и время ещё есть
+            if self.date_combo.findText(selected_date) >= 0:
+                self.date_combo.setCurrentText(selected_date)
+                if self.time_combo.findText(selected_time) >= 0:
+                    self.time_combo.setCurrentText(selected_time)
 
     def load_map(self):
-        selected_folder = self.folder_combo.currentText()
+        selected_folder = self.selected_folder()
         selected_date = self.date_combo.currentText()
         selected_time = self.time_combo.currentText()
 
-        if not selected_folder or not selected_date or not selected_time:
+        if selected_folder == "" or not selected_date or not selected_time:
             print("Folder, date, or time not selected")
             return
 
@@ -222,8 +236,13 @@ class MapPage(QWidget):
         m = folium.Map(location=[55.7558, 37.6173], zoom_start=10)
         marker_cluster = MarkerCluster().add_to(m)
 
-        photos = self.db.get_photos_for_map(selected_folder, selected_datetime)
-        print(f"Photos for {selected_folder} at {selected_datetime}: {photos}")
+        if selected_folder is None:
+            # Все камеры одним запросом
+            photos = self.db.get_map_snapshot(selected_datetime)
+            print(f"Snapshot at {selected_datetime}: {len(photos)} folders")
+        else:
+            photos = self.db.get_photos_for_map(selected_folder, selected_datetime)
+            print(f"Photos for {selected_folder} at {selected_datetime}: {photos}")
 
         if not photos:
             print(f"No photos found for {selected_folder} at {selected_datetime}")
@@ -240,6 +259,8 @@ class MapPage(QWidget):
                     lat, lon = self.folder_coordinates[folder]
                     print(f"Adding marker for folder {folder} at {lat}, {lon}")
                     popup_text = f"Folder: {folder}<br>Animals: {photo['animal_count']}<br>Unique animals: {photo['unique_animal_count']}"
+                    if 'timestamp' in photo:
+                        popup_text += f"<br>Time: {photo['timestamp']}"
                     folium.Marker(
                         [lat, lon], 
                         popup=popup_text,
@@ -0,0 +1,115 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from detector import YoloDetector, make_session_options, DEFAULT_BATCH_SIZE, DEFAULT_INPUT_SIZE
+from ingestion import IngestionPipeline, plan_folder, build_scenes
+from instrumentation import Instrumentation, profile_path
+from thumbnails import ThumbnailStore
+
+DEFAULT_SHARD_SIZE = 64
+
+# Конвейер процесса-обработчика, создаётся один раз в _init_worker
+_worker_pipeline = None
+
+
+def worker_threads(workers, cpu_count=None):
+    """Потоки ONNX Runtime и декодирования на процесс, чтобы процессы вместе не занимали больше ядер, чем есть."""
+    per_worker = max(1, (cpu_count or os.cpu_count() or 1) // workers)
+    intra_op_threads = max(1, per_worker - 1) if per_worker > 2 else per_worker
+    decode_workers = max(1, per_worker - intra_op_threads)
+    return intra_op_threads, decode_workers
+
+
+def _init_worker(model_path, labels, batch_size, input_size, intra_op_threads, decode_workers, thumbnail_root,
+                 class_confidence_thresholds):
+    global _worker_pipeline
+    detector = YoloDetector(model_path, labels, batch_size=batch_size, input_size=input_size,
+                            class_confidence_thresholds=class_confidence_thresholds,
+                            session_options=make_session_options(intra_op_threads, 1))
+    thumbnail_store = ThumbnailStore(thumbnail_root) if thumbnail_root else None
+    _worker_pipeline = IngestionPipeline(detector, decode_workers=decode_workers, thumbnail_store=thumbnail_store)
+
+
+def _detect_shard(paths):
+    """Результаты шарда и замеры стадий процесса, которые родитель добавляет к замерам папки."""
+    metrics = Instrumentation()
+    results = list(_worker_pipeline.run(paths, metrics=metrics))
+    samples, counters = metrics.snapshot()
+    return results, samples, counters
+
+
+class ParallelIngestion:
+    """Обработка папок в нескольких процессах.
+
+    Папки режутся на шарды по shard_size фото в порядке времени съёмки, шарды
+    всех папок обрабатываются процессами параллельно, у каждого процесса своя
+    InferenceSession. Результаты возвращаются в родительский процесс, который
+    единственный пишет в SQLite и собирает сцены каждой папки по порядку.
+    """
+
+    def __init__(self, model_path, labels, workers=None, batch_size=DEFAULT_BATCH_SIZE,
+                 input_size=DEFAULT_INPUT_SIZE, shard_size=DEFAULT_SHARD_SIZE, thumbnail_root=None,
+                 class_confidence_thresholds=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.shard_size = max(1, shard_size)
+        intra_op_threads, decode_workers = worker_threads(self.workers)
+        self.init_args = (model_path, labels, batch_size, input_size, intra_op_threads, decode_workers,
+                          thumbnail_root, class_confidence_thresholds)
+
+    def ingest_folders(self, folders, db, cancel_event=None, on_progress=None, on_folder=None, profile_dir=None):
+        """Обрабатывает папки и возвращает список статистик, как у ingest_folder.
+
+        on_progress(folder, done, total) - после каждого шарда, on_folder(stats) - после каждой папки.
+        profile_dir - каталог для cProfile родительского процесса (сборка сцен и запись в базу)
+        по папкам; замеры стадий процессов-обработчиков попадают в отчёт папки в любом случае.
+        """
+        folder_metrics = [Instrumentation(profile_path(profile_dir, folder)) for folder in folders]
+        plans = [plan_folder(folder, db, metrics=metrics) for folder, metrics in zip(folders, folder_metrics)]
+        shards = ((index, plan.paths[start:start + self.shard_size])
+                  for index, plan in enumerate(plans)
+                  for start in range(0, len(plan.paths), self.shard_size))
+
+        # Шардов в работе держим немного больше, чем процессов, чтобы процессы не простаивали,
+        # а отмена не ждала обработки всех папок
+        max_pending = self.workers * 2
+        pending = deque()
+        all_stats = []
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=self.init_args) as executor:
+            def submit_more():
+                while len(pending) < max_pending:
+                    shard = next(shards, None)
+                    if shard is None:
+                        return
+                    pending.append((shard[0], executor.submit(_detect_shard, shard[1])))
+
+            def folder_results(index, folder, total):
+                done = 0
+                while pending and pending[0][0] == index:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    results, samples, counters = pending.popleft()[1].result()
+                    folder_metrics[index].merge(samples, counters)
+                    submit_more()
+                    yield from results
+                    done += len(results)
+                    if on_progress:
+                        on_progress(folder, done, total)
+
+            try:
+                submit_more()
+                for index, plan in enumerate(plans):
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    start_time = time.time()
+                    folder_metrics[index].profile_thread()
+                    stats = build_scenes(plan, folder_results(index, plan.folder, len(plan.paths)), db,
+                                         cancel_event, start_time=start_time, metrics=folder_metrics[index])
+                    all_stats.append(stats)
+                    if on_folder:
+                        on_folder(stats)
+            finally:
+                for _, future in pending:
+                    future.cancel()
+        return all_stats
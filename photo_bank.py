@@ -1,32 +1,48 @@
 import os
-from datetime import datetime, timedelta
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QTableWidget, QTableWidgetItem, QFileDialog, QProgressDialog,
+                             QTableWidget, QTableWidgetItem, QFileDialog, QProgressBar,
                              QComboBox, QLabel, QSpinBox, QMessageBox, QHeaderView, QSizePolicy)
 from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPixmap
-from PIL import Image
-from PIL.ExifTags import TAGS
+from PyQt6.QtGui import QPixmap, QColor
 from navigation_menu import NavigationMenu
-import cv2
-import numpy as np
-import onnxruntime
-import csv
-import openpyxl
-import time
+from database import load_labels, load_class_thresholds
+from ingest_worker import IngestionWorker
+from thumbnails import ThumbnailStore, LRUCache, THUMBNAIL_DIR_NAME, THUMBNAIL_SIZE
+from thumbnail_loader import ThumbnailLoader
+from export_worker import ExportWorker
 
 class PhotoBankPage(QWidget):
-    def __init__(self, db, show_processing_page):
+    def __init__(self, db, show_processing_page, batch_size=None, decode_workers=None, queue_size=None):
         super().__init__()
         self.db = db
         self.show_processing_page = show_processing_page
         self.items_per_page = 15
-        self.init_ui()
+        # None - значения по умолчанию из detector.py и ingestion.py
+        self.batch_size = batch_size
+        self.decode_workers = decode_workers
+        self.queue_size = queue_size
         self.current_page = 1
         self.total_pages = 1
         self.current_folder = None
-        self.onnx_session = onnxruntime.InferenceSession('models/best.onnx', providers=['CPUExecutionProvider'])
-        self.labels = self.load_labels('labels.txt')
+        self.page_keys = {1: None}  # номер страницы -> (timestamp, id), после которого она начинается
+        self.page_photo_ids = []
+        self.thumbnail_store = ThumbnailStore(os.path.join(os.path.dirname(os.path.abspath(db.db_path)), THUMBNAIL_DIR_NAME))
+        self.thumbnail_cache = LRUCache(sizeof=lambda pixmap: pixmap.width() * pixmap.height() * pixmap.depth() // 8)
+        self.thumbnail_loader = ThumbnailLoader(self.thumbnail_store, self.thumbnail_cache, parent=self)
+        self.thumbnail_loader.thumbnail_ready.connect(self.on_thumbnail_ready)
+        self.page_rows_by_path = {}
+        self.placeholder_pixmap = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE * 3 // 4)
+        self.placeholder_pixmap.fill(QColor('#e0e0e0'))
+        self.init_ui()
+        self.ingestion_results = []
+        self.export_worker = None
+        self.ingestion_worker = IngestionWorker(self.create_pipeline, self.db.db_path, self)
+        self.ingestion_worker.model_loading.connect(self.on_model_loading)
+        self.ingestion_worker.folder_started.connect(self.on_ingestion_started)
+        self.ingestion_worker.progress.connect(self.on_ingestion_progress)
+        self.ingestion_worker.folder_finished.connect(self.on_ingestion_finished)
+        self.ingestion_worker.folder_failed.connect(self.on_ingestion_failed)
+        self.ingestion_worker.queue_empty.connect(self.on_ingestion_queue_empty)
 
     def init_ui(self):
         main_layout = QVBoxLayout()
@@ -106,9 +122,37 @@ class PhotoBankPage(QWidget):
         button_layout.addWidget(self.export_xlsx_button)
         main_layout.addLayout(button_layout)
 
+        # Статус фоновой обработки папок
+        self.ingestion_status_widget = QWidget()
+        status_layout = QHBoxLayout(self.ingestion_status_widget)
+        status_layout.setContentsMargins(0, 0, 0, 0)
+        self.ingestion_status_label = QLabel()
+        self.ingestion_progress = QProgressBar()
+        self.cancel_ingestion_button = QPushButton("Отмена")
+        status_layout.addWidget(self.ingestion_status_label)
+        status_layout.addWidget(self.ingestion_progress, 1)
+        status_layout.addWidget(self.cancel_ingestion_button)
+        self.ingestion_status_widget.setVisible(False)
+        main_layout.addWidget(self.ingestion_status_widget)
+
+        # Статус фоновой выгрузки
+        self.export_status_widget = QWidget()
+        export_status_layout = QHBoxLayout(self.export_status_widget)
+        export_status_layout.setContentsMargins(0, 0, 0, 0)
+        self.export_status_label = QLabel()
+        self.export_progress = QProgressBar()
+        self.cancel_export_button = QPushButton("Отмена")
+        export_status_layout.addWidget(self.export_status_label)
+        export_status_layout.addWidget(self.export_progress, 1)
+        export_status_layout.addWidget(self.cancel_export_button)
+        self.export_status_widget.setVisible(False)
+        main_layout.addWidget(self.export_status_widget)
+
         self.setLayout(main_layout)
 
         self.upload_folder_button.clicked.connect(self.upload_folder)
+        self.cancel_ingestion_button.clicked.connect(self.cancel_ingestion)
+        self.cancel_export_button.clicked.connect(self.cancel_export)
         self.export_csv_button.clicked.connect(self.export_csv)
         self.export_xlsx_button.clicked.connect(self.export_xlsx)
         self.photo_table.cellDoubleClicked.connect(self.open_photo)
@@ -123,15 +167,18 @@ class PhotoBankPage(QWidget):
         self.prev_button.clicked.connect(self.prev_page)
         self.next_button.clicked.connect(self.next_page)
 
-    def load_labels(self, labels_path):
-        with open(labels_path, 'r') as f:
-            return [line.strip() for line in f.readlines()]
-        
     def load_folders(self):
         folders = self.db.get_unique_folders()
+        # Сохраняем выбранную папку, чтобы обновление списка не сбрасывало таблицу
+        selected = self.folder_combo.currentText()
+        self.folder_combo.blockSignals(True)
         self.folder_combo.clear()
         self.folder_combo.addItem("Все папки")
         self.folder_combo.addItems(folders)
+        self.folder_combo.setCurrentIndex(max(self.folder_combo.findText(selected), 0))
+        self.folder_combo.blockSignals(False)
+        folder = self.folder_combo.currentText()
+        self.current_folder = None if folder == "Все папки" else folder
 
     def on_folder_changed(self, folder):
         self.current_folder = None if folder == "Все папки" else folder
@@ -139,20 +186,41 @@ class PhotoBankPage(QWidget):
         self.load_photos()
 
     def load_photos(self):
-        photos = self.db.get_photos(folder=self.current_folder)
-        self.total_pages = (len(photos) - 1) // self.items_per_page + 1
+        # Полная перезагрузка: пересчитываем страницы и сбрасываем ключи пагинации
+        total_photos = self.db.count_photos(self.current_folder)
+        self.total_pages = max(1, (total_photos - 1) // self.items_per_page + 1)
+        self.current_page = min(self.current_page, self.total_pages)
+        self.page_keys = {1: None}
         self.page_spin.setMaximum(self.total_pages)
+        self.show_page()
+
+    def show_page(self):
         self.update_pagination_controls()
 
-        start_idx = (self.current_page - 1) * self.items_per_page
-        end_idx = start_idx + self.items_per_page
-        page_photos = photos[start_idx:end_idx]
+        # Идём от ближайшей известной страницы; при последовательном листании offset равен 0
+        known_page = max(page for page in self.page_keys if page <= self.current_page)
+        page_photos = self.db.get_photos_page(
+            self.current_folder,
+            after=self.page_keys[known_page],
+            limit=self.items_per_page,
+            offset=(self.current_page - known_page) * self.items_per_page
+        )
+        if page_photos:
+            last_photo = page_photos[-1]
+            self.page_keys[self.current_page + 1] = (last_photo[8], last_photo[0])
+        self.page_photo_ids = [photo[0] for photo in page_photos]
+        self.page_rows_by_path = {}
+        for row, photo in enumerate(page_photos):
+            self.page_rows_by_path.setdefault(photo[1], []).append(row)
 
         self.photo_table.setRowCount(len(page_photos))
         for row, photo in enumerate(page_photos):
             photo_id, path, folder, upload_date, processed, scene_id, animal_count, unique_animal_count, timestamp = photo
             
-            pixmap = QPixmap(path).scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio)
+            # Миниатюры подгружаются в фоне, пока показываем заглушку
+            pixmap = self.thumbnail_loader.cached(path)
+            if pixmap is None:
+                pixmap = self.placeholder_pixmap
             thumbnail_item = QTableWidgetItem()
             thumbnail_item.setData(Qt.ItemDataRole.DecorationRole, pixmap)
             self.photo_table.setItem(row, 0, thumbnail_item)
@@ -164,6 +232,22 @@ class PhotoBankPage(QWidget):
             self.photo_table.setItem(row, 5, QTableWidgetItem(str(unique_animal_count) if unique_animal_count is not None else ""))
             self.photo_table.setItem(row, 6, QTableWidgetItem(str(scene_id) if scene_id is not None else ""))
 
+        self.thumbnail_loader.request(list(self.page_rows_by_path), self.next_page_paths())
+
+    def next_page_paths(self):
+        # Предзагрузка миниатюр следующей страницы
+        if self.current_page >= self.total_pages or self.current_page + 1 not in self.page_keys:
+            return []
+        next_photos = self.db.get_photos_page(self.current_folder, after=self.page_keys[self.current_page + 1],
+                                              limit=self.items_per_page)
+        return [photo[1] for photo in next_photos]
+
+    def on_thumbnail_ready(self, path, pixmap):
+        for row in self.page_rows_by_path.get(path, ()):
+            item = self.photo_table.item(row, 0)
+            if item is not None:
+                item.setData(Qt.ItemDataRole.DecorationRole, pixmap)
+
     def update_pagination_controls(self):
         self.page_label.setText(f"{self.current_page} из {self.total_pages}")
         self.page_spin.setValue(self.current_page)
@@ -173,222 +257,105 @@ class PhotoBankPage(QWidget):
     def prev_page(self):
         if self.current_page > 1:
             self.current_page -= 1
-            self.load_photos()
+            self.show_page()
 
     def next_page(self):
         if self.current_page < self.total_pages:
             self.current_page += 1
-            self.load_photos()
+            self.show_page()
 
     def on_page_changed(self, page):
         if page != self.current_page:
             self.current_page = page
-            self.load_photos()
+            self.show_page()
 
     def upload_folder(self):
         folder_name = QFileDialog.getExistingDirectory(self, "Выберите папку с фотографиями")
         if folder_name:
-            start_time = time.time()
-            image_files = [f for f in os.listdir(folder_name) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
-            image_files.sort(key=lambda x: self.get_photo_timestamp(os.path.join(folder_name, x)))
-            
-            progress = QProgressDialog("Загрузка и обработка фотографий...", "Отмена", 0, len(image_files), self)
-            progress.setWindowModality(Qt.WindowModality.WindowModal)
-            progress.setWindowTitle("Прогресс загрузки и обработки")
-            
-            scenes = []
-            current_scene = None
-            last_photo_time = None
-            last_class = None  # Добавляем для отслеживания последнего класса детекции
-            last_detection_time = None  # Добавляем для отслеживания времени последней детекции
-            
-            processed_images = 0
-            
-            for i, image_file in enumerate(image_files):
-                if progress.wasCanceled():
-                    break
-                
-                file_path = os.path.join(folder_name, image_file)
-                timestamp = self.get_photo_timestamp(file_path)
-                
-                if current_scene is None or self.is_new_scene(timestamp, last_photo_time):
-                    if current_scene is not None:
-                        scenes.append(current_scene)
-                    current_scene = {
-                        'photos': [],
-                        'animal_ids': set(),
-                        'max_unique_animals': 0,
-                        'bboxes': []  # Добавляем список для хранения всех bounding boxes сцены
-                    }
-                
-                results = self.process_image_with_yolo(file_path)
-                
-                bbox_strings = []
-                current_photo_animal_ids = set()
-                for detection in results:
-                    x1, y1, x2, y2 = map(int, detection['bbox'])
-                    category = detection['class']
-                    
-                    # Фильтрация выбросов
-                    if last_class is not None and (timestamp - last_detection_time) < timedelta(seconds=30):
-                        category = last_class
-                    
-                    animal_id = self.get_or_create_animal_id(current_scene['bboxes'], current_scene['animal_ids'], (x1, y1, x2, y2))
-                    bbox_strings.append(f"{x1},{y1},{x2},{y2},{animal_id},{category}")
-                    current_photo_animal_ids.add(animal_id)
-                    current_scene['bboxes'].append((x1, y1, x2, y2))
-                    
-                    last_class = category  # Обновляем последний класс детекции
-                    last_detection_time = timestamp  # Обновляем время последней детекции
-                
-                bbox_string = ";".join(bbox_strings)
-                
-                animal_count = len(bbox_strings)
-                unique_animal_count = len(current_photo_animal_ids)
-                current_scene['max_unique_animals'] = max(current_scene['max_unique_animals'], unique_animal_count)
-                
-                current_scene['photos'].append({
-                    'path': file_path,
-                    'timestamp': timestamp,
-                    'animal_count': animal_count,
-                    'unique_animal_count': unique_animal_count,
-                    'bbox_string': bbox_string
-                })
-                
-                last_photo_time = timestamp
-                processed_images += 1
-                progress.setValue(i + 1)
-            
-            if current_scene is not None:
-                scenes.append(current_scene)
-            
-            progress.setLabelText("Сохранение данных в базу...")
-            progress.setRange(0, len(scenes))
-            progress.setValue(0)
-
-            unique_animal_counts = []
-            for i, scene in enumerate(scenes):
-                unique_animal_count_ = 0
-                for photo in scene['photos']:
-                    unique_animal_count_ = max(unique_animal_count_, photo['unique_animal_count'])
-                unique_animal_counts.append(unique_animal_count_)
-
-            for i, scene in enumerate(scenes):
-                scene_id = self.db.create_new_scene()
-                for photo in scene['photos']:
-                    photo_id = self.db.add_photo(photo['path'], photo['timestamp'])
-                    self.db.update_photo_processing(
-                        photo_id, 
-                        scene_id, 
-                        photo['animal_count'], 
-                        unique_animal_counts[i], 
-                        photo['bbox_string'], 
-                        photo['timestamp']
-                    )
-                self.db.update_scene_unique_count(scene_id, unique_animal_counts[i])
-                progress.setValue(i + 1)
-            
-            progress.setValue(len(scenes))
-            self.load_folders() 
-            self.load_photos()
-
-            end_time = time.time()
-            processing_time = end_time - start_time
-
-            # Показываем всплывающее окно с информацией о времени обработки и количестве обработанных изображений
-            QMessageBox.information(
-                self,
-                "Обработка завершена",
-                f"Обработано изображений: {processed_images}\n"
-                f"Затраченное время: {processing_time:.2f} секунд"
-            )
-
-    def process_image_with_yolo(self, image_path):
-        image = cv2.imread(image_path)
-        original_height, original_width = image.shape[:2]
-        input_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        input_image = cv2.resize(input_image, (1024, 1024))
-        input_image = input_image.astype(np.float32) / 255.0
-        input_image = np.transpose(input_image, (2, 0, 1))
-        input_image = np.expand_dims(input_image, axis=0)
-        
-        input_name = self.onnx_session.get_inputs()[0].name
-        output_name = self.onnx_session.get_outputs()[0].name
-        
-        outputs = self.onnx_session.run([output_name], {input_name: input_image})
-        
-        detections = outputs[0][0]
-        
-        confidence_threshold = 0.5
-        filtered_detections = detections[detections[:, 4] > confidence_threshold]
-        
-        results = []
-        for detection in filtered_detections:
-            class_id = int(detection[5])
-            confidence = detection[4]
-            bbox = detection[:4]
-            
-            # Преобразование координат bbox обратно к оригинальному размеру изображения
-            x1, y1, x2, y2 = bbox
-            x1 = int(x1 * original_width / 1024)
-            y1 = int(y1 * original_height / 1024)
-            x2 = int(x2 * original_width / 1024)
-            y2 = int(y2 * original_height / 1024)
-            
-            results.append({
-                'class': self.labels[class_id],
-                'confidence': float(confidence),
-                'bbox': [x1, y1, x2, y2]
-            })
-        
-        return results
-
-    def get_photo_timestamp(self, file_path):
-        try:
-            with Image.open(file_path) as img:
-                exif = img._getexif()
-                if exif:
-                    for tag_id, value in exif.items():
-                        tag = TAGS.get(tag_id, tag_id)
-                        if tag == 'DateTimeOriginal':
-                            return datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
-                    
-                    for tag_id, value in exif.items():
-                        tag = TAGS.get(tag_id, tag_id)
-                        if tag in ['DateTime', 'DateTimeDigitized']:
-                            return datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
-        except Exception as e:
-            print(f"Ошибка при чтении EXIF данных: {e}")
-        
-        return datetime.fromtimestamp(os.path.getmtime(file_path))
-
-    def is_new_scene(self, current_time, last_photo_time):
-        if last_photo_time is None:
-            return True
-        time_difference = current_time - last_photo_time
-        return time_difference > timedelta(minutes=30)
-
-    def get_or_create_animal_id(self, scene_bboxes, animal_ids, new_bbox):
-        for i, existing_bbox in enumerate(scene_bboxes):
-            if self.is_same_animal(existing_bbox, new_bbox):
-                return f"animal_{i+1}"
-        
-        new_id = f"animal_{len(animal_ids) + 1}"
-        animal_ids.add(new_id)
-        return new_id
-
-    def is_same_animal(self, bbox1, bbox2):
-        x1, y1, x2, y2 = bbox1
-        x3, y3, x4, y4 = bbox2
-        center1 = ((x1 + x2) / 2, (y1 + y2) / 2)
-        center2 = ((x3 + x4) / 2, (y3 + y4) / 2)
-        distance = ((center1[0] - center2[0])**2 + (center1[1] - center2[1])**2)**0.5
-        return distance < 50
+            self.ingestion_worker.enqueue(folder_name)
+            self.update_ingestion_status()
+
+    def cancel_ingestion(self):
+        self.ingestion_worker.cancel_current()
+        self.ingestion_status_label.setText("Отмена...")
+
+    def update_ingestion_status(self, done=None, total=None):
+        folder = self.ingestion_worker.current_folder
+        pending = self.ingestion_worker.pending_count()
+        text = f"Обработка: {folder}" if folder else "Ожидание обработки"
+        if pending:
+            text += f" (в очереди: {pending})"
+        self.ingestion_status_label.setText(text)
+        if total is not None:
+            self.ingestion_progress.setRange(0, total)
+            self.ingestion_progress.setValue(done)
+        self.ingestion_status_widget.setVisible(True)
+
+    def on_ingestion_started(self, folder, pending):
+        self.ingestion_progress.setValue(0)
+        self.update_ingestion_status()
+
+    def on_model_loading(self):
+        self.ingestion_status_label.setText("Загрузка модели...")
+
+    def on_ingestion_progress(self, folder, done, total):
+        self.update_ingestion_status(done, total)
+
+    def on_ingestion_finished(self, folder, stats):
+        self.ingestion_results.append(stats)
+        # Новые фото сразу становятся доступны для просмотра
+        self.load_folders()
+        self.load_photos()
+
+    def on_ingestion_failed(self, folder, error):
+        print(error)
+        QMessageBox.warning(self, "Ошибка обработки", f"Не удалось обработать папку {folder}")
+
+    def on_ingestion_queue_empty(self):
+        self.ingestion_status_widget.setVisible(False)
+        results, self.ingestion_results = self.ingestion_results, []
+        if not results:
+            return
+
+        from instrumentation import summarize_report
+
+        # Показываем всплывающее окно с информацией о времени обработки и количестве обработанных изображений
+        lines = []
+        for stats in results:
+            line = (f"{stats['folder']}: обработано изображений: {stats['processed']} из {stats['total']}, "
+                    f"затраченное время: {stats['elapsed']:.2f} секунд")
+            if stats['skipped']:
+                line += f", уже были в базе: {stats['skipped']}"
+            if stats['cancelled']:
+                line += " (отменено)"
+            lines.append(line)
+            if stats['processed']:
+                # Полный отчёт по стадиям сохранён в таблице import_runs
+                lines.append(f"    дольше всего: {summarize_report(stats['report'])}")
+        QMessageBox.information(self, "Обработка завершена", "\n".join(lines))
+
+    def shutdown(self):
+        self.thumbnail_loader.shutdown()
+        self.ingestion_worker.stop()
+        if self.export_worker is not None and self.export_worker.isRunning():
+            self.export_worker.cancel()
+            self.export_worker.wait()
+
+    def create_pipeline(self):
+        # Вызывается из потока загрузки при первой обработке папки
+        from detector import YoloDetector, DEFAULT_BATCH_SIZE
+        from ingestion import IngestionPipeline, DEFAULT_DECODE_WORKERS, DEFAULT_QUEUE_SIZE
+
+        detector = YoloDetector('models/best.onnx', load_labels('labels.txt'),
+                                batch_size=self.batch_size or DEFAULT_BATCH_SIZE,
+                                class_confidence_thresholds=load_class_thresholds())
+        return IngestionPipeline(detector, decode_workers=self.decode_workers or DEFAULT_DECODE_WORKERS,
+                                 queue_size=self.queue_size or DEFAULT_QUEUE_SIZE,
+                                 thumbnail_store=self.thumbnail_store)
 
     def open_photo(self, row, column):
-        start_idx = (self.current_page - 1) * self.items_per_page
-        photo_id = self.db.get_photos(folder=self.current_folder)[start_idx + row][0]
-        self.show_processing_page(photo_id)
+        if row < len(self.page_photo_ids):
+            self.show_processing_page(self.page_photo_ids[row])
 
     def showEvent(self, event):
         super().showEvent(event)
@@ -402,39 +369,50 @@ class PhotoBankPage(QWidget):
         self.export_data('xlsx')
 
     def export_data(self, format):
+        if self.export_worker is not None and self.export_worker.isRunning():
+            QMessageBox.information(self, "Экспорт", "Дождитесь окончания текущей выгрузки")
+            return
         folder = self.current_folder if self.current_folder != "Все папки" else None
-        data = self.db.get_export_data(folder)
 
         if format == 'csv':
             file_path, _ = QFileDialog.getSaveFileName(self, "Сохранить CSV", "", "CSV Files (*.csv)")
-            if file_path:
-                with open(file_path, 'w', newline='') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(['folder_name', 'class', 'date_registration_start', 'date_registration_end', 'count'])
-                    for row in data:
-                        writer.writerow([
-                            int(row[0].split('/')[-1]),
-                            row[1],
-                            row[2].strftime('%Y-%m-%d %H:%M:%S'),
-                            row[3].strftime('%Y-%m-%d %H:%M:%S'),
-                            row[4]
-                        ])
-        elif format == 'xlsx':
+        else:
             file_path, _ = QFileDialog.getSaveFileName(self, "Сохранить XLSX", "", "Excel Files (*.xlsx)")
-            if file_path:
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.append(['folder_name', 'class', 'date_registration_start', 'date_registration_end', 'count'])
-                for row in data:
-                    ws.append([
-                        row[0],
-                        row[1],
-                        row[2].strftime('%Y-%m-%d %H:%M:%S'),
-                        row[3].strftime('%Y-%m-%d %H:%M:%S'),
-                        row[4]
-                    ])
-                wb.save(file_path)
-
-        if file_path:
-            QMessageBox.information(self, "Экспорт завершен", f"Данные успешно экспортированы в {file_path}")
+        if not file_path:
+            return
+        # Формат выбирается по расширению файла
+        if not file_path.lower().endswith('.' + format):
+            file_path += '.' + format
+
+        self.export_worker = ExportWorker(self.db.db_path, file_path, folder, self)
+        self.export_worker.progress.connect(self.on_export_progress)
+        self.export_worker.finished_export.connect(self.on_export_finished)
+        self.export_worker.failed.connect(self.on_export_failed)
+        self.export_worker.cancelled.connect(self.on_export_cancelled)
+        self.export_status_label.setText(f"Выгрузка: {file_path}")
+        self.export_progress.setRange(0, 0)
+        self.export_status_widget.setVisible(True)
+        self.export_worker.start()
+
+    def cancel_export(self):
+        if self.export_worker is not None:
+            self.export_worker.cancel()
+            self.export_status_label.setText("Отмена...")
+
+    def on_export_progress(self, done, total):
+        self.export_progress.setRange(0, max(total, 1))
+        self.export_progress.setValue(min(done, total))
+
+    def on_export_finished(self, file_path, count):
+        self.export_status_widget.setVisible(False)
+        QMessageBox.information(self, "Экспорт завершен",
+                                f"Данные успешно экспортированы в {file_path} (строк: {count})")
+
+    def on_export_failed(self, file_path, error):
+        print(error)
+        self.export_status_widget.setVisible(False)
+        QMessageBox.warning(self, "Ошибка экспорта", f"Не удалось выгрузить данные в {file_path}")
+
+    def on_export_cancelled(self, file_path):
+        self.export_status_widget.setVisible(False)
 
@@ -79,25 +79,13 @@ class PhotoProcessingPage(QWidget):
         photo_data = self.db.get_photo(photo_id)
         if photo_data:
             self.original_pixmap = QPixmap(photo_data[1])  # path is at index 1
-            self.bboxes = self.parse_bbox_string(photo_data[9])  # bbox_string is at index 9
+            self.bboxes = self.db.get_bounding_boxes(photo_id)
             self.display_photo(self.original_pixmap)
             self.update_info_label(photo_data)
         else:
             self.info_label.setText("Фото не найдено")
             self.photo_label.clear()
 
-    def parse_bbox_string(self, bbox_string):
-        if not bbox_string:
-            return []
-        bboxes = []
-        for bbox in bbox_string.split(";"):
-            parts = bbox.split(",")
-            if len(parts) >= 6:
-                x1, y1, x2, y2 = map(int, parts[:4])
-                animal_id, category = parts[4], parts[5]
-                bboxes.append((x1, y1, x2, y2, animal_id, category))
-        return bboxes
-
     def display_photo(self, pixmap):
         scaled_width = int(self.width() * 0.8)
         scaled_height = int(self.height() * 0.6)
@@ -128,7 +116,7 @@ class PhotoProcessingPage(QWidget):
 
     def update_info_label(self, photo_data):
         if photo_data:
-            id, path, folder, upload_date, processed, scene_id, animal_count, unique_animal_count, timestamp, bbox_string = photo_data
+            id, path, folder, upload_date, processed, scene_id, animal_count, unique_animal_count, timestamp = photo_data
             
             info_text = f"<h2>Информация о фото</h2>"
             info_text += f"<p><b>ID фото:</b> {id}</p>"
@@ -142,10 +130,9 @@ class PhotoProcessingPage(QWidget):
             info_text += f"<p><b>Временная метка:</b> {timestamp}</p>"
             info_text += f"<h3>Bounding Boxes:</h3>"
             
-            if bbox_string:
+            if self.bboxes:
                 info_text += "<ul>"
-                for bbox in bbox_string.split(";"):
-                    x1, y1, x2, y2, animal_id, category = bbox.split(",")
+                for x1, y1, x2, y2, animal_id, category in self.bboxes:
                     info_text += f"<li>{category} {animal_id}: ({x1}, {y1}, {x2}, {y2})</li>"
                 info_text += "</ul>"
             else:
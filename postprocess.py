@@ -0,0 +1,105 @@
+from collections import namedtuple
+
+import numpy as np
+
+DEFAULT_CONFIDENCE_THRESHOLD = 0.5
+DEFAULT_IOU_THRESHOLD = 0.45
+DEFAULT_TOP_K = 100
+MAX_NMS_CANDIDATES = 1000
+
+# boxes: (N, 4) float32 x1, y1, x2, y2 в координатах исходного изображения,
+# scores: (N,) float32, class_ids: (N,) int32. Отсортированы по убыванию scores.
+Detections = namedtuple('Detections', ['boxes', 'scores', 'class_ids'])
+
+
+def empty_detections():
+    return Detections(np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int32))
+
+
+def class_thresholds(labels, overrides=None, default=DEFAULT_CONFIDENCE_THRESHOLD):
+    """Массив порогов уверенности по индексу класса.
+
+    overrides: {имя класса или индекс: порог} для отдельных классов из labels.txt.
+    """
+    thresholds = np.full(len(labels), default, dtype=np.float32)
+    for key, value in (overrides or {}).items():
+        if isinstance(key, str) and key not in labels:
+            raise ValueError(f"порог задан для неизвестного класса: {key}")
+        index = labels.index(key) if isinstance(key, str) else int(key)
+        thresholds[index] = value
+    return thresholds
+
+
+def postprocess_batch(raw, transforms, image_sizes, thresholds,
+                      iou_threshold=DEFAULT_IOU_THRESHOLD, top_k=DEFAULT_TOP_K):
+    """Постобработка выхода модели для пачки изображений.
+
+    raw: (B, N, 6) - x1, y1, x2, y2, confidence, class во входных координатах модели.
+    transforms: (B, 4) - scale_x, scale_y, pad_x, pad_y: исходная координата
+        равна (координата модели - pad) * scale.
+    image_sizes: (B, 2) - ширина и высота исходных изображений, для обрезки боксов.
+    Возвращает список Detections, по одному на изображение.
+    """
+    raw = np.asarray(raw, dtype=np.float32)
+    transforms = np.asarray(transforms, dtype=np.float32).reshape(-1, 4)
+    image_sizes = np.asarray(image_sizes, dtype=np.float32).reshape(-1, 2)
+
+    # Порог по классу сразу для всей пачки
+    class_ids = np.clip(raw[..., 5].astype(np.int32), 0, len(thresholds) - 1)
+    mask = raw[..., 4] > thresholds[class_ids]
+
+    # Перевод всех боксов пачки в координаты исходных изображений
+    scale = np.repeat(transforms[:, None, :2], 2, axis=1).reshape(-1, 1, 4)
+    pad = np.repeat(transforms[:, None, 2:], 2, axis=1).reshape(-1, 1, 4)
+    boxes = (raw[..., :4] - pad) * scale
+    limits = np.repeat(image_sizes[:, None, :], 2, axis=1).reshape(-1, 1, 4)
+    np.clip(boxes, 0, limits, out=boxes)
+
+    results = []
+    for i in range(raw.shape[0]):
+        selected = np.flatnonzero(mask[i])
+        results.append(_select(boxes[i, selected], raw[i, selected, 4], class_ids[i, selected],
+                               iou_threshold, top_k))
+    return results
+
+
+def postprocess(raw, transform, image_size, thresholds,
+                iou_threshold=DEFAULT_IOU_THRESHOLD, top_k=DEFAULT_TOP_K):
+    return postprocess_batch(np.asarray(raw)[None], [transform], [image_size], thresholds,
+                             iou_threshold, top_k)[0]
+
+
+def _select(boxes, scores, class_ids, iou_threshold, top_k):
+    if len(scores) == 0:
+        return empty_detections()
+    if len(scores) > MAX_NMS_CANDIDATES:
+        # На очень загруженных кадрах NMS получает только лучших кандидатов
+        candidates = np.argpartition(-scores, MAX_NMS_CANDIDATES)[:MAX_NMS_CANDIDATES]
+        boxes, scores, class_ids = boxes[candidates], scores[candidates], class_ids[candidates]
+    keep = nms(boxes, scores, class_ids, iou_threshold)[:top_k]
+    return Detections(boxes[keep], scores[keep], class_ids[keep])
+
+
+def nms(boxes, scores, class_ids, iou_threshold=DEFAULT_IOU_THRESHOLD):
+    """NMS с учётом классов. Возвращает индексы оставленных боксов по убыванию scores."""
+    if len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Сдвигаем боксы каждого класса в свою область, чтобы разные классы не подавляли друг друга
+    offsets = class_ids.astype(np.float32)[:, None] * (boxes.max() + 1)
+    shifted = boxes + offsets
+    x1, y1, x2, y2 = shifted[:, 0], shifted[:, 1], shifted[:, 2], shifted[:, 3]
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        width = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        height = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        intersection = width * height
+        iou = intersection / (areas[best] + areas[rest] - intersection + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
@@ -0,0 +1,126 @@
+import queue
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+LETTERBOX_COLOR = 114
+
+# Режимы OpenCV, в которых JPEG декодируется сразу уменьшенным в 8/4/2 раза (масштабирование DCT)
+REDUCED_READ_MODES = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# scale_x/scale_y - сколько пикселей модели приходится на пиксель исходного изображения,
+# pad_x/pad_y - отступы слева и сверху, width/height - размер исходного изображения
+LetterboxInfo = namedtuple('LetterboxInfo', ['scale_x', 'scale_y', 'pad_x', 'pad_y', 'width', 'height'])
+
+
+def read_image(path, min_size=None):
+    """Декодирует изображение для детекции.
+
+    JPEG, у которого длинная сторона хотя бы в 2 раза больше min_size, декодируется
+    сразу уменьшенным - с наименьшим масштабом, при котором длинная сторона
+    остаётся не меньше min_size. Возвращает (image, source_size), где source_size -
+    (ширина, высота) исходного изображения, или (None, None), если файл не читается.
+    """
+    mode, width, height = cv2.IMREAD_COLOR, None, None
+    if min_size:
+        try:
+            # Image.open читает только заголовок
+            with Image.open(path) as header:
+                if header.format == 'JPEG':
+                    width, height = header.size
+        except OSError:
+            pass
+        if width:
+            for factor, reduced_mode in REDUCED_READ_MODES:
+                if max(width, height) // factor >= min_size:
+                    mode = reduced_mode
+                    break
+
+    image = cv2.imread(path, mode)
+    if image is None:
+        return None, None
+    decoded_height, decoded_width = image.shape[:2]
+    if mode == cv2.IMREAD_COLOR:
+        return image, (decoded_width, decoded_height)
+    # OpenCV поворачивает изображение по EXIF Orientation, размер из заголовка - до поворота
+    if (decoded_width > decoded_height) != (width > height):
+        width, height = height, width
+    return image, (width, height)
+
+
+def letterbox(image, size, canvas=None, source_size=None):
+    """Вписывает BGR-изображение в квадрат size x size с сохранением пропорций.
+
+    Результат пишется в canvas (uint8, size x size x 3), если он передан;
+    заливаются только поля, а уменьшенное изображение пишется сразу на своё место.
+    source_size - (ширина, высота) исходного изображения, если image декодирован
+    уменьшенным (см. read_image); боксы тогда переводятся в исходный размер.
+    """
+    height, width = image.shape[:2]
+    source_width, source_height = source_size or (width, height)
+    scale = min(size / width, size / height)
+    new_width = min(size, max(1, round(width * scale)))
+    new_height = min(size, max(1, round(height * scale)))
+    pad_x = (size - new_width) // 2
+    pad_y = (size - new_height) // 2
+
+    if canvas is None:
+        canvas = np.empty((size, size, 3), dtype=np.uint8)
+    canvas[:pad_y] = LETTERBOX_COLOR
+    canvas[pad_y + new_height:] = LETTERBOX_COLOR
+    canvas[pad_y:pad_y + new_height, :pad_x] = LETTERBOX_COLOR
+    canvas[pad_y:pad_y + new_height, pad_x + new_width:] = LETTERBOX_COLOR
+
+    region = canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width]
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(image, (new_width, new_height), dst=region, interpolation=interpolation)
+    if resized is not region:
+        region[...] = resized
+
+    return canvas, LetterboxInfo(scale * width / source_width, scale * height / source_height,
+                                 pad_x, pad_y, source_width, source_height)
+
+
+def fill_tensor(canvas, out):
+    """BGR HWC uint8 -> RGB CHW float32 в [0, 1] за один проход прямо в out (3 x S x S)."""
+    np.multiply(canvas.transpose(2, 0, 1)[::-1], np.float32(1 / 255), out=out, casting='unsafe')
+    return out
+
+
+def inverse_transforms(infos):
+    """Параметры обратного преобразования для postprocess: (scale_x, scale_y, pad_x, pad_y)."""
+    transforms = np.empty((len(infos), 4), dtype=np.float32)
+    for i, info in enumerate(infos):
+        transforms[i] = (1 / info.scale_x, 1 / info.scale_y, info.pad_x, info.pad_y)
+    return transforms
+
+
+class CanvasPool:
+    """Набор заранее выделенных буферов под letterbox, переиспользуемых между изображениями.
+
+    acquire блокируется, пока все буферы заняты, поэтому пул заодно ограничивает
+    число подготовленных изображений в памяти.
+    """
+
+    def __init__(self, count, size):
+        self.free = queue.Queue()
+        for _ in range(count):
+            self.free.put(np.empty((size, size, 3), dtype=np.uint8))
+
+    def acquire(self, stop=None):
+        """Берёт свободный буфер; если задан stop и он установлен во время ожидания, возвращает None."""
+        while True:
+            try:
+                return self.free.get(timeout=0.1 if stop is not None else None)
+            except queue.Empty:
+                if stop.is_set():
+                    return None
+
+    def release(self, canvas):
+        self.free.put(canvas)
@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+import numpy as np
+
+from tracker import Tracker
+
+SCENE_GAP = timedelta(minutes=30)
+
+
+def to_seconds(timestamps):
+    """datetime или строки 'YYYY-MM-DD HH:MM:SS' -> int64 секунды."""
+    return np.asarray(timestamps, dtype='datetime64[s]').astype(np.int64)
+
+
+def segment_scenes(timestamps, scene_gap=SCENE_GAP):
+    """Номер сцены (0, 1, ...) для каждого фото по отсортированным временам съёмки.
+
+    Новая сцена начинается, когда промежуток между соседними фото больше scene_gap.
+    """
+    seconds = to_seconds(timestamps)
+    if len(seconds) == 0:
+        return np.empty(0, dtype=np.int64)
+    breaks = np.diff(seconds) > scene_gap.total_seconds()
+    return np.concatenate([[0], np.cumsum(breaks)])
+
+
+def scene_slices(labels):
+    """Границы сцен в массиве меток: список (start, stop)."""
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(labels)) + 1])
+    stops = np.append(starts[1:], len(labels))
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def resegment_folder(db, folder, scene_gap=None):
+    """Пересобирает сцены папки по новому промежутку без повторной детекции.
+
+    scene_gap сохраняется как настройка папки; None - взять сохранённый или
+    SCENE_GAP. Сцены, состав которых не изменился, остаются как есть; в изменённых
+    животные заново сопоставляются трекером по боксам из базы.
+    Возвращает (число сцен, число пересобранных сцен).
+    """
+    if scene_gap is None:
+        scene_gap = db.get_scene_gap(folder) or SCENE_GAP
+    else:
+        db.set_scene_gap(folder, scene_gap)
+
+    rows = db.get_folder_scene_rows(folder)
+    if not rows:
+        return 0, 0
+    photo_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    timestamps = np.array([row[1] for row in rows], dtype='datetime64[s]')
+    old_scene_ids = np.array([row[2] if row[2] is not None else -1 for row in rows], dtype=np.int64)
+    old_ids, old_sizes = np.unique(old_scene_ids, return_counts=True)
+    old_size = dict(zip(old_ids.tolist(), old_sizes.tolist()))
+
+    labels = segment_scenes(timestamps, scene_gap)
+    slices = scene_slices(labels)
+    changed = []
+    for start, stop in slices:
+        scene_ids = old_scene_ids[start:stop]
+        first = int(scene_ids[0])
+        if first >= 0 and (scene_ids == first).all() and old_size[first] == stop - start:
+            continue
+        changed.append((start, stop))
+    if not changed:
+        return len(slices), 0
+
+    changed_photo_ids = np.concatenate([photo_ids[start:stop] for start, stop in changed]).tolist()
+    detections = db.get_detections_for_photos(changed_photo_ids)
+
+    scenes = []
+    for start, stop in changed:
+        tracker = Tracker()
+        photo_counts = []
+        animal_ids = []
+        for photo_id, timestamp in zip(photo_ids[start:stop].tolist(), timestamps[start:stop].astype(object)):
+            photo_detections = detections.get(photo_id, [])
+            boxes = np.array([d[1:] for d in photo_detections], dtype=np.float32).reshape(-1, 4)
+            ids = tracker.update(boxes, timestamp).tolist()
+            photo_counts.append(len(set(ids)))
+            animal_ids.extend((animal_id, d[0]) for animal_id, d in zip(ids, photo_detections))
+        scenes.append((max(photo_counts), photo_ids[start:stop].tolist(), animal_ids))
+
+    db.rewrite_scenes(scenes, set(old_scene_ids[np.concatenate([np.arange(a, b) for a, b in changed])].tolist()))
+    return len(slices), len(changed)
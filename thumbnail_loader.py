@@ -0,0 +1,97 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QImageReader, QPixmap
+from thumbnails import THUMBNAIL_SIZE
+
+CURRENT_PAGE_PRIORITY = 1
+PREFETCH_PRIORITY = 0
+
+
+def load_thumbnail_image(store, path):
+    """Читает миниатюру из дискового кэша, при её отсутствии создаёт и сохраняет.
+
+    Работает с QImage, поэтому безопасна для вызова из фоновых потоков.
+    """
+    thumbnail_path = store.get(path)
+    if thumbnail_path:
+        image = QImage(thumbnail_path)
+        if not image.isNull():
+            return image
+
+    # Фото, загруженные до появления кэша: декодируем сразу в уменьшенном
+    # размере (для JPEG это масштабирование при декодировании) и сохраняем
+    reader = QImageReader(path)
+    reader.setScaledSize(reader.size().scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.AspectRatioMode.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return image
+    # Если сюда дошли при существующем файле, он не читается - заменяем
+    store.write(path, lambda tmp_path: image.save(tmp_path, 'JPG', 85), overwrite=True)
+    return image
+
+
+class ThumbnailJobSignals(QObject):
+    loaded = pyqtSignal(int, str, QImage)  # поколение запроса, путь, миниатюра
+
+
+class ThumbnailJob(QRunnable):
+    def __init__(self, loader, generation, path):
+        super().__init__()
+        self.loader = loader
+        self.generation = generation
+        self.path = path
+        self.signals = ThumbnailJobSignals()
+
+    def run(self):
+        # Пользователь уже ушёл со страницы, для которой ставилась задача
+        if self.generation != self.loader.generation:
+            return
+        image = load_thumbnail_image(self.loader.store, self.path)
+        self.signals.loaded.emit(self.generation, self.path, image)
+
+
+class ThumbnailLoader(QObject):
+    """Загружает миниатюры страницы в пуле потоков и отдаёт их в GUI-поток.
+
+    Каждый вызов request начинает новое поколение: задачи прошлых страниц,
+    которые ещё не начались, снимаются из очереди, а начавшиеся игнорируются.
+    """
+
+    thumbnail_ready = pyqtSignal(str, QPixmap)
+
+    def __init__(self, store, cache, max_threads=4, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.cache = cache
+        self.generation = 0
+        self.pending = set()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+
+    def cached(self, path):
+        return self.cache.get(path)
+
+    def request(self, paths, prefetch_paths=()):
+        self.generation += 1
+        self.pool.clear()
+        self.pending.clear()
+        for path, priority in [(p, CURRENT_PAGE_PRIORITY) for p in paths] + \
+                              [(p, PREFETCH_PRIORITY) for p in prefetch_paths]:
+            if path in self.pending or path in self.cache:
+                continue
+            self.pending.add(path)
+            job = ThumbnailJob(self, self.generation, path)
+            job.signals.loaded.connect(self.on_loaded)
+            self.pool.start(job, priority)
+
+    def on_loaded(self, generation, path, image):
+        pixmap = QPixmap.fromImage(image)
+        if not pixmap.isNull():
+            self.cache.put(path, pixmap)
+        if generation == self.generation:
+            self.pending.discard(path)
+            self.thumbnail_ready.emit(path, pixmap)
+
+    def shutdown(self):
+        self.generation += 1
+        self.pool.clear()
+        self.pool.waitForDone()
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+THUMBNAIL_SIZE = 100
+THUMBNAIL_DIR_NAME = 'thumbnails'
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ThumbnailStore:
+    """Дисковый кэш миниатюр.
+
+    Имя файла - sha1 от (путь, размер, mtime) исходного фото, поэтому изменённый
+    файл получает новую миниатюру, а старая просто перестаёт использоваться.
+    """
+
+    def __init__(self, root, size=THUMBNAIL_SIZE):
+        self.root = root
+        self.size = size
+
+    def path_for(self, image_path, create_dirs=False):
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        key = hashlib.sha1(f"{os.path.abspath(image_path)}\0{stat.st_size}\0{stat.st_mtime_ns}".encode()).hexdigest()
+        directory = os.path.join(self.root, key[:2])
+        if create_dirs:
+            os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, key + '.jpg')
+
+    def get(self, image_path):
+        thumbnail_path = self.path_for(image_path)
+        if thumbnail_path and os.path.exists(thumbnail_path):
+            return thumbnail_path
+        return None
+
+    def save(self, image_path, image):
+        """Сохраняет миниатюру уже декодированного BGR-изображения."""
+        # OpenCV нужен только при загрузке, фотобанк без него стартует быстрее
+        import cv2
+
+        def write_file(tmp_path):
+            resized = image
+            height, width = image.shape[:2]
+            scale = self.size / max(height, width)
+            if scale < 1:
+                resized = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                                     interpolation=cv2.INTER_AREA)
+            return cv2.imwrite(tmp_path, resized, [cv2.IMWRITE_JPEG_QUALITY, 85])
+
+        return self.write(image_path, write_file)
+
+    def write(self, image_path, write_file, overwrite=False):
+        """Записывает миниатюру фото: write_file(tmp_path) сохраняет JPEG и возвращает True при успехе.
+
+        Возвращает путь миниатюры или None, если фото недоступно или записать не удалось.
+        Уже существующая миниатюра без overwrite не перезаписывается.
+        """
+        thumbnail_path = self.path_for(image_path, create_dirs=True)
+        if thumbnail_path is None or (not overwrite and os.path.exists(thumbnail_path)):
+            return thumbnail_path
+
+        # Пишем во временный файл и переименовываем, чтобы браузер не прочитал недописанную миниатюру
+        tmp_path = f"{thumbnail_path}.{os.getpid()}.{threading.get_ident()}.tmp.jpg"
+        try:
+            if not write_file(tmp_path):
+                return None
+            os.replace(tmp_path, thumbnail_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return thumbnail_path
+
+
+class LRUCache:
+    """LRU-кэш в памяти с вытеснением по суммарному размеру значений в байтах."""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.items = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key][0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            if key in self.items:
+                self.total_bytes -= self.items.pop(key)[1]
+            self.items[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self.items) > 1:
+                _, (_, evicted_size) = self.items.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,44 @@
+class FolderTimeIndex:
+    """Даты и времена съёмки по папкам для выбора момента на карте; папка None - все папки.
+
+    Результаты запросов кэшируются по папкам. Кэш сбрасывается целиком, когда
+    базу изменило другое подключение (PRAGMA data_version - например, поток
+    загрузки), и по папке - через invalidate после её загрузки.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.dates = {}   # папка -> ['YYYY-MM-DD', ...]
+        self.times = {}   # (папка, дата) -> ['HH:MM:SS', ...]
+        self.data_version = None
+
+    def check_data_version(self):
+        version = self.db.get_data_version()
+        if version != self.data_version:
+            self.dates.clear()
+            self.times.clear()
+            self.data_version = version
+
+    def get_dates(self, folder):
+        self.check_data_version()
+        if folder not in self.dates:
+            self.dates[folder] = self.db.get_folder_dates(folder)
+        return self.dates[folder]
+
+    def get_times(self, folder, day):
+        self.check_data_version()
+        key = (folder, day)
+        if key not in self.times:
+            self.times[key] = self.db.get_folder_times(folder, day)
+        return self.times[key]
+
+    def invalidate(self, folder=None):
+        """Сбрасывает кэш папки (и общий по всем папкам) или, без аргумента, весь."""
+        if folder is None:
+            self.dates.clear()
+            self.times.clear()
+            return
+        for cached in (folder, None):
+            self.dates.pop(cached, None)
+        for key in [key for key in self.times if key[0] in (folder, None)]:
+            del self.times[key]
@@ -0,0 +1,145 @@
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+
+# Трек, который столько времени не сопоставлялся ни с одной детекцией, закрывается
+TRACK_MAX_AGE = timedelta(minutes=2)
+# Максимальное расстояние между центрами боксов в долях их среднего размера (диагонали)
+MAX_CENTER_DISTANCE = 0.75
+
+
+def box_diagonals(boxes):
+    return np.hypot(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+
+
+def box_centers(boxes):
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+
+
+def pair_costs(det_boxes, track_boxes, max_distance=MAX_CENTER_DISTANCE):
+    """Стоимость сопоставления пар детекция-трек (боксы (K, 4) по парам).
+
+    Расстояние между центрами делится на средний размер боксов, поэтому
+    не зависит от разрешения. Стоимость - нормированное расстояние минус IoU;
+    пары, которые не пересекаются и слишком далеко, получают inf.
+    """
+    x1 = np.maximum(det_boxes[:, 0], track_boxes[:, 0])
+    y1 = np.maximum(det_boxes[:, 1], track_boxes[:, 1])
+    x2 = np.minimum(det_boxes[:, 2], track_boxes[:, 2])
+    y2 = np.minimum(det_boxes[:, 3], track_boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    det_areas = (det_boxes[:, 2] - det_boxes[:, 0]) * (det_boxes[:, 3] - det_boxes[:, 1])
+    track_areas = (track_boxes[:, 2] - track_boxes[:, 0]) * (track_boxes[:, 3] - track_boxes[:, 1])
+    iou = intersection / (det_areas + track_areas - intersection + 1e-9)
+
+    scale = (box_diagonals(det_boxes) + box_diagonals(track_boxes)) / 2 + 1e-9
+    distance = np.linalg.norm(box_centers(det_boxes) - box_centers(track_boxes), axis=1) / scale
+
+    costs = distance - iou
+    costs[(iou <= 0) & (distance > max_distance)] = np.inf
+    return costs
+
+
+def greedy_assignment(rows, cols, costs):
+    """Жадное сопоставление один к одному по возрастанию стоимости.
+
+    rows, cols, costs - пары-кандидаты. Возвращает выбранные пары (rows, cols).
+    """
+    order = np.argsort(costs, kind='stable')
+    order = order[np.isfinite(costs[order])]
+    used_rows, used_cols = set(), set()
+    matched_rows, matched_cols = [], []
+    for k in order:
+        row, col = rows[k], cols[k]
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matched_rows.append(row)
+        matched_cols.append(col)
+    return np.array(matched_rows, dtype=np.int64), np.array(matched_cols, dtype=np.int64)
+
+
+class Tracker:
+    """Сопоставление животных между соседними кадрами одной сцены.
+
+    Детекции кадра сопоставляются с активными треками по IoU и расстоянию
+    между центрами; несопоставленные детекции открывают новые треки с
+    номерами 1, 2, ... Треки, которые не видели дольше max_age, закрываются,
+    поэтому стоимость кадра зависит от числа животных в кадре, а не от длины сцены.
+    """
+
+    def __init__(self, max_age=TRACK_MAX_AGE, max_distance=MAX_CENTER_DISTANCE):
+        self.max_age = max_age
+        self.max_distance = max_distance
+        self.next_id = 1
+        self.track_ids = np.empty(0, dtype=np.int64)
+        self.track_boxes = np.empty((0, 4), dtype=np.float32)
+        self.last_seen = []
+
+    @property
+    def active_count(self):
+        return len(self.track_ids)
+
+    def update(self, boxes, timestamp):
+        """Возвращает массив id животных для боксов кадра (N, 4) в том же порядке."""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.expire(timestamp)
+
+        ids = np.zeros(len(boxes), dtype=np.int64)
+        matched = np.zeros(len(boxes), dtype=bool)
+        if len(boxes) and self.active_count:
+            rows, cols = self.candidates(boxes)
+            if len(rows):
+                costs = pair_costs(boxes[rows], self.track_boxes[cols], self.max_distance)
+                det_index, track_index = greedy_assignment(rows, cols, costs)
+                ids[det_index] = self.track_ids[track_index]
+                matched[det_index] = True
+                self.track_boxes[track_index] = boxes[det_index]
+                for index in track_index:
+                    self.last_seen[index] = timestamp
+
+        new = np.flatnonzero(~matched)
+        if len(new):
+            new_ids = np.arange(self.next_id, self.next_id + len(new))
+            self.next_id += len(new)
+            ids[new] = new_ids
+            self.track_ids = np.concatenate([self.track_ids, new_ids])
+            self.track_boxes = np.concatenate([self.track_boxes, boxes[new]])
+            self.last_seen.extend([timestamp] * len(new))
+        return ids
+
+    def expire(self, timestamp):
+        if not self.last_seen:
+            return
+        alive = np.array([timestamp - seen <= self.max_age for seen in self.last_seen], dtype=bool)
+        if alive.all():
+            return
+        self.track_ids = self.track_ids[alive]
+        self.track_boxes = self.track_boxes[alive]
+        self.last_seen = [seen for seen, keep in zip(self.last_seen, alive) if keep]
+
+    def candidates(self, boxes):
+        """Пары (детекция, трек), которые вообще могут совпасть, через сетку по центрам треков.
+
+        Размер ячейки не меньше максимального допустимого расстояния между центрами,
+        поэтому достаточно смотреть соседние ячейки 3x3.
+        """
+        all_diagonals = np.concatenate([box_diagonals(boxes), box_diagonals(self.track_boxes)])
+        cell = max(float(all_diagonals.max()) * max(self.max_distance, 1.0), 1.0)
+
+        grid = defaultdict(list)
+        track_cells = np.floor(box_centers(self.track_boxes) / cell).astype(np.int64)
+        for index, (cx, cy) in enumerate(track_cells.tolist()):
+            grid[cx, cy].append(index)
+
+        rows, cols = [], []
+        det_cells = np.floor(box_centers(boxes) / cell).astype(np.int64)
+        for row, (cx, cy) in enumerate(det_cells.tolist()):
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for col in grid.get((cx + dx, cy + dy), ()):
+                        rows.append(row)
+                        cols.append(col)
+        return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)